@@ -0,0 +1,6 @@
+import sys
+from scripts.cli import main
+
+# guarded, update spawns worker processes that import this file again
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,51 @@
-import requests
-
-parse_dict = {
-    "+" : "%2B",
-}
-
-def url_parse(url):
-    result = ""
-    for x in url:
-        if x in parse_dict:
-            result += parse_dict[x]
-        else:
-            result += x
-    return result
+import os
+import math
+import threading
+
+from .response_cache import ResponseCache, ttl_for
+
+edsm_url = "https://www.edsm.net"
+# EDSM refuses sphere searches larger than this
+edsm_max_sphere_radius = 100
+# next to the scripts package, wherever it's run from
+edsm_cache_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database_cache", "edsm.sqlite")
+
+client = None
+client_lock = threading.Lock()
+
+# the client (requests session, thread pool and the sqlite cache) is made on the first call, not on import
+def get_client():
+    global client
+    if client is None:
+        with client_lock:
+            if client is None:
+                from .edsm_client import EdsmClient
+                client = EdsmClient(cache=ResponseCache(edsm_cache_file))
+    return client
 
 def api_call(url):
-    url = url_parse(url)
-    response = requests.get(url)
-    return response.json()
+    return get_client().get_json(url)
+
+# runs many calls concurrently, responses in the same order as urls
+def api_call_many(urls):
+    return get_client().get_json_many(urls)
 
 
+# online mode has no local spatial index, radius searches go to EDSM
+def has_spatial_index():
+    return False
+
+# EDSM answers sphere searches itself, lazy neighbor expansion doesn't scan anything locally
+def has_fast_radius_search():
+    return True
+
 # returns system coordinate value
 def get_system_coord(systemName):
     if not systemName:
         print("ERROR: Need system name to get coordinate!")
         return None
     
-    url = "https://www.edsm.net/api-v1/system?systemName={}&showCoordinates=1".format(systemName)
+    url = "{}/api-v1/system?systemName={}&showCoordinates=1".format(edsm_url, systemName)
     response = api_call(url)
 
     if not response:
@@ -43,9 +63,19 @@ def is_system_anarchy(systemName):
         print("ERROR: Need system name to find if anarchy!")
         return None
     
-    url = "https://www.edsm.net/api-v1/system?systemName={}&showInformation=1".format(systemName)
-    response = api_call(url)
+    response = api_call(anarchy_url(systemName))
+    return parse_anarchy(response)
+
+# returns dict of system name -> true if anarchy, asked concurrently
+def is_system_anarchy_many(systemNames):
+    systemNames = list(dict.fromkeys(systemNames))
+    responses = api_call_many([anarchy_url(systemName) for systemName in systemNames])
+    return {systemName: parse_anarchy(response) for systemName, response in zip(systemNames, responses)}
+
+def anarchy_url(systemName):
+    return "{}/api-v1/system?systemName={}&showInformation=1".format(edsm_url, systemName)
 
+def parse_anarchy(response):
     if not response:
         print("ERROR: Couldn't find system for checking anarchy!")
         return True
@@ -64,10 +94,10 @@ def get_systems_in_radius(systemName, radius, coords=None, minRadius=None, inclu
         print("ERROR: Need system name to find nearby!")
         raise
     
-    url = "https://www.edsm.net/api-v1/sphere-systems?systemName={}&radius={}&showCoordinates=1".format(systemName, radius)
+    url = "{}/api-v1/sphere-systems?systemName={}&radius={}&showCoordinates=1".format(edsm_url, systemName, radius)
     if coords:
         if len(coords) == 3:
-            url = "https://www.edsm.net/api-v1/sphere-systems?x={}&y={}&z={}&radius={}&showCoordinates=1".format(coords['x'], coords['y'], coords['z'], radius)
+            url = "{}/api-v1/sphere-systems?x={}&y={}&z={}&radius={}&showCoordinates=1".format(edsm_url, coords['x'], coords['y'], coords['z'], radius)
     if minRadius:
         url += "&minRadius={}".format(minRadius)
     response = api_call(url)
@@ -80,11 +110,66 @@ def get_systems_in_radius(systemName, radius, coords=None, minRadius=None, inclu
     for system in response:
         if "name" not in system or "distance" not in system or "coords" not in system:
             continue
-        if not includeAnarchy:
-            if is_system_anarchy(system["name"]):
-                continue
         result.append(system)
 
+    if not includeAnarchy:
+        result = filter_anarchy(result)
+
+    return result
+
+# drops anarchy systems from a list of system entries, checking them all at once
+def filter_anarchy(systems):
+    anarchy = is_system_anarchy_many([system["name"] for system in systems])
+    return [system for system in systems if not anarchy[system["name"]]]
+
+# distance from point to the segment start -> end
+def segment_distance(point, start, end):
+    direction = [e - s for s, e in zip(start, end)]
+    lengthSq = sum(d * d for d in direction)
+    if not lengthSq:
+        return math.dist(point, start)
+    t = sum((p - s) * d for p, s, d in zip(point, start, direction)) / lengthSq
+    t = max(0, min(1, t))
+    return math.dist(point, [s + t * d for s, d in zip(start, direction)])
+
+# returns list of all systems within width of the line between two coordinates,
+# stitched together from sphere searches along the line
+def get_systems_in_corridor(startCoords, targetCoords, width, includeAnarchy=False):
+    start = [startCoords['x'], startCoords['y'], startCoords['z']]
+    end = [targetCoords['x'], targetCoords['y'], targetCoords['z']]
+
+    # spheres of radius 1.5 * width, width apart, cover the corridor
+    if width * 1.5 > edsm_max_sphere_radius:
+        width = edsm_max_sphere_radius / 1.5
+        print("LOG: Corridor width limited to {} by EDSM's sphere radius.".format(width))
+    radius = width * 1.5
+    sampleCount = int(math.ceil(math.dist(start, end) / width)) + 1 if width > 0 else 1
+
+    samples = []
+    for i in range(sampleCount):
+        t = i / (sampleCount - 1) if sampleCount > 1 else 0
+        samples.append([s + (e - s) * t for s, e in zip(start, end)])
+    urls = ["{}/api-v1/sphere-systems?x={}&y={}&z={}&radius={}&showCoordinates=1".format(edsm_url, sample[0], sample[1], sample[2], radius)
+            for sample in samples]
+
+    found = {}
+    for sample, response in zip(samples, api_call_many(urls)):
+        if not response:
+            print("ERROR: Couldn't find systems around {}!".format(sample))
+            continue
+        for system in response:
+            if "name" not in system or "coords" not in system or system["name"] in found:
+                continue
+            point = [system["coords"]["x"], system["coords"]["y"], system["coords"]["z"]]
+            if segment_distance(point, start, end) > width:
+                continue
+            system["distance"] = math.dist(point, start)
+            found[system["name"]] = system
+
+    result = list(found.values())
+    if not includeAnarchy:
+        result = filter_anarchy(result)
+
     return result
 
 # returns list of all stations of the system
@@ -93,9 +178,19 @@ def get_stations(systemName, noPlanet=True):
         print("ERROR: Need system name to find stations!")
         return None
     
-    url = "https://www.edsm.net/api-system-v1/stations?systemName={}".format(systemName)
-    response = api_call(url)
+    response = api_call(stations_url(systemName))
+    return parse_stations(response, noPlanet)
+
+# returns dict of system name -> station names, asked concurrently
+def get_stations_many(systemNames, noPlanet=True):
+    systemNames = list(dict.fromkeys(systemNames))
+    responses = api_call_many([stations_url(systemName) for systemName in systemNames])
+    return {systemName: parse_stations(response, noPlanet) for systemName, response in zip(systemNames, responses)}
+
+def stations_url(systemName):
+    return "{}/api-system-v1/stations?systemName={}".format(edsm_url, systemName)
 
+def parse_stations(response, noPlanet=True):
     if not response:
         print("ERROR: Couldn't find system and/or its station!")
         return None
@@ -119,6 +214,40 @@ def get_stations(systemName, noPlanet=True):
 
     return result
 
+# station name -> distance from the arrival star (ls), same request as get_stations so it's usually cached
+def get_station_distances(systemName):
+    if not systemName:
+        return {}
+    return parse_station_distances(api_call(stations_url(systemName)))
+
+# returns dict of system name -> station distances, asked concurrently
+def get_station_distances_many(systemNames):
+    systemNames = list(dict.fromkeys(systemNames))
+    responses = api_call_many([stations_url(systemName) for systemName in systemNames])
+    return {systemName: parse_station_distances(response) for systemName, response in zip(systemNames, responses)}
+
+def parse_station_distances(response):
+    if not response or not response.get("stations"):
+        return {}
+    result = {}
+    for station in response["stations"]:
+        if "name" in station and station.get("distanceToArrival") is not None:
+            result[station["name"]] = station["distanceToArrival"]
+    return result
+
+# returns dict of (systemName, stationName) -> station id, None where not found
+# same requests as get_stations so they're usually cached
+def get_station_ids_many(locations):
+    locations = list(dict.fromkeys(locations))
+    systemNames = list(dict.fromkeys(systemName for systemName, stationName in locations))
+    responses = api_call_many([stations_url(systemName) for systemName in systemNames])
+    stationIds = {}
+    for systemName, response in zip(systemNames, responses):
+        for station in (response or {}).get("stations") or []:
+            if "name" in station and "id" in station:
+                stationIds[(systemName, station["name"])] = station["id"]
+    return {location: stationIds.get(location) for location in locations}
+
 # returns market data of a specific station
 def get_market_data(systemName, stationName):
     if not systemName:
@@ -128,9 +257,39 @@ def get_market_data(systemName, stationName):
         print("ERROR: Need station name to find market!")
         return None
     
-    url = "https://www.edsm.net/api-system-v1/stations/market?systemName={}&stationName={}".format(systemName, stationName)
-    response = api_call(url)
+    response = api_call(market_url(systemName, stationName))
+    return parse_market(response)
+
+# markets come from the api one by one, there are no price tables
+def get_price_matrix():
+    return None
+
+# nothing to load ahead, answers come from the api and its response cache
+def warm_up():
+    pass
+
+# there's no local dataset, so there's no version to follow
+def get_dataset_version():
+    return 0
+
+# stations kept in memory expire when their cached market response would, see get_dataset_version
+def get_station_max_age():
+    return ttl_for(market_url("", ""))[0]
+
+# no price matrix online, every market comes through get_market_data_many
+def get_market_rows_many(locations):
+    return None, {}
+
+# returns dict of (systemName, stationName) -> market data, asked concurrently
+def get_market_data_many(locations):
+    locations = list(dict.fromkeys(locations))
+    responses = api_call_many([market_url(systemName, stationName) for systemName, stationName in locations])
+    return {location: parse_market(response) for location, response in zip(locations, responses)}
+
+def market_url(systemName, stationName):
+    return "{}/api-system-v1/stations/market?systemName={}&stationName={}".format(edsm_url, systemName, stationName)
 
+def parse_market(response):
     if not response:
         print("ERROR: Couldn't find system and/or its station and/or the market!")
         return None
@@ -1,23 +1,48 @@
 import math
-from collections import deque
+import time
+import heapq
+import threading
+from collections import deque, OrderedDict
+import numpy as np
+
+from . import spatial_index as si
+from . import trade
+from . import cost_model as cm
 
 #from . import api_edsm as api
 from . import offline_database as api
 
+# default corridor width around the direct line, in jump ranges
+corridor_jump_width = 3
+# route searches RoutePlanner can run
+route_engines = ["bfs", "astar"]
+# rough memory of a StationInfo, a fixed part plus each listed commodity, for the registry's cap
+station_base_bytes = 1024
+station_commodity_bytes = 512
+# default memory cap of the station registry
+station_registry_bytes = 256 * 1024 * 1024
+
 """
 Data Classes
 """
 class MarketInfo:
-    def __init__(self, marketD):
+    # sparse is (commodity columns, values) for trade.MarketTable, given when the market comes
+    # from the price matrix, then there are no market records (marketD) to parse
+    def __init__(self, marketD, sparse=None):
         self.marketD = marketD
         self.demandList = {}
         self.availableStock = {}
 
+        if sparse is not None:
+            self.sparse = sparse
+            return
         # now parse the data for easier access later
         self.parse_data()
 
     # get list of demanded items
     def parse_data(self):
+        # (commodity columns, values) for building trade.MarketTable
+        self.sparse = trade.sparse_market(self.marketD)
         if not self.marketD:
             return
         # loop all market data
@@ -34,11 +59,19 @@ class MarketInfo:
         sorted(self.demandList.items(), key=lambda item: item[1]["demand"])
 
 class StationInfo:
-    def __init__(self, stationName, systemName):
+    # distanceToArrival is the station's distance from the arrival star in ls, None if unknown
+    # marketData (or sparseMarket, see MarketInfo) can be handed in when it was loaded in a batch,
+    # otherwise it's looked up here
+    def __init__(self, stationName, systemName, distanceToArrival=None, marketData=None, sparseMarket=None):
         self.name = stationName
         self.systemName = systemName
+        self.distanceToArrival = distanceToArrival
 
-        marketData = get_market_data(self.systemName, self.name)
+        if sparseMarket is not None:
+            self.marketInfo = MarketInfo(None, sparseMarket)
+            return
+        if marketData is None:
+            marketData = get_market_data(self.systemName, self.name)
         self.marketInfo = MarketInfo(marketData)
 
     """
@@ -50,6 +83,86 @@ class StationInfo:
     def __repr__(self): 
         return self.__str__()
 
+# per process cache of StationInfos by station id, shared by every plan and system copy
+# least recently used stations are dropped once the estimated memory passes maxBytes
+# stations aren't changed after creation, so handing the same object out again is safe
+# with maxAge (seconds) stations older than that are loaded again, for backends without dataset versions
+# plans may run on several threads (i.e the planner service), so every access holds the lock
+class StationRegistry:
+    def __init__(self, maxBytes=station_registry_bytes, maxAge=None):
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.stations = OrderedDict()   # station id -> (StationInfo, estimated bytes, time added)
+        self.size = 0
+        self.datasetVersion = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __contains__(self, stationId):
+        return stationId in self.stations
+
+    def get(self, stationId):
+        with self.lock:
+            entry = self.stations.get(stationId)
+            if entry is None:
+                return None
+            if self.maxAge is not None and time.time() - entry[2] > self.maxAge:
+                self.discard(stationId)
+                return None
+            self.stations.move_to_end(stationId)
+            return entry[0]
+
+    def add(self, stationId, station : StationInfo):
+        size = station_size(station)
+        with self.lock:
+            self.discard(stationId)
+            self.stations[stationId] = (station, size, time.time())
+            self.size += size
+            self.evict()
+        return station
+
+    def remove(self, stationId):
+        with self.lock:
+            self.discard(stationId)
+
+    def discard(self, stationId):
+        entry = self.stations.pop(stationId, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    # the newest station is kept even when it alone is over the cap
+    def evict(self):
+        while self.size > self.maxBytes and len(self.stations) > 1:
+            _, (station, size, added) = self.stations.popitem(last=False)
+            self.size -= size
+
+    def resize(self, maxBytes):
+        with self.lock:
+            self.maxBytes = maxBytes
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.stations.clear()
+            self.size = 0
+
+    # drops everything once the backend's data changed, e.g. after an incremental update
+    # and takes over the backend's maxAge, None where the dataset version is enough
+    def sync(self, datasetVersion, maxAge=None):
+        with self.lock:
+            self.maxAge = maxAge
+            if datasetVersion != self.datasetVersion:
+                self.stations.clear()
+                self.size = 0
+                self.datasetVersion = datasetVersion
+
+def station_size(station : StationInfo):
+    return station_base_bytes + station_commodity_bytes * len(station.marketInfo.sparse[0])
+
+station_registry = StationRegistry()
+
 class SystemInfo:
     def __init__(self, systemName: str, coords: list=[0,0,0], distance: float=0):
         self.name = systemName
@@ -58,19 +171,16 @@ class SystemInfo:
 
         self.stationToScan = []
         self.stationInfos = []
+        self.b_gathered = False   # station infos were loaded
 
-        self.neighbors = []
-
-    def add_neighbor(self, neighbor):
-        self.neighbors.append(neighbor)
+        self.index = None   # position in RuntimeDatabase.systems
 
     def get_all_stationNames(self):
         self.stationToScan = get_stations(self.name)
 
     # run this to gather and keep stations and market infos
     def gather_station_infos(self):
-        for stationName in self.stationToScan:
-            self.stationInfos.append(StationInfo(stationName, self.name))
+        gather_systems([self])
 
     def isolate_station(self, stationName):
         stationInfo = None
@@ -98,139 +208,83 @@ class SystemInfo:
         result = SystemInfo(self.name, self.coords, self.distance)
         result.stationToScan[:] = self.stationToScan[:]
         result.stationInfos[:] = self.stationInfos[:]
-        result.neighbors = self.neighbors
+        result.b_gathered = self.b_gathered
+        result.index = self.index
         return result
     
 class RouteInfo:
-    def __init__(self, fromSystem: SystemInfo, toSystem: SystemInfo, deviations: list, cargoSpace: int):
+    # capital limits what can be bought per leg (credits), None for no limit
+    # maxStops is how many deviation stops a route may make, each adding stopSeconds to the route's time
+    # with jumpRange (needed to count jumps) routes are ranked by credits per hour under costModel (default cm.CostModel()),
+    # without it by profit alone
+    def __init__(self, fromSystem: SystemInfo, toSystem: SystemInfo, deviations: list, cargoSpace: int, capital=None, maxStops=1, stopSeconds=0, costModel=None, jumpRange=None):
         self.cargoSpace = cargoSpace
+        self.capital = capital
+        self.maxStops = maxStops
+        self.stopSeconds = stopSeconds
+        self.costModel = costModel or cm.CostModel()
+        self.jumpRange = jumpRange
         self.fromSystem = fromSystem
         self.toSystem = toSystem
         self.deviations = deviations
 
         print("LOG: Calculating trade between {} and {}".format(fromSystem, toSystem))
-        straightRoutesDict = self.calcalate_between_2(fromSystem, toSystem)
-        straightRouteName, straightRoute = self.pick_highest_profit_route(straightRoutesDict)
-        self.routeName = straightRouteName
-        self.route = straightRoute
-
-        print("LOG: Straight route found, now calculate deviations...")
-        deviateRoutesDict = self.calculate_with_deviation()
-        if deviateRoutesDict:
-            deviateRouteName, deviateRoute = self.pick_highest_profit_route(deviateRoutesDict)
-            # if deviate route has a lot more profit, then assign as correct route
-            if self.route:
-                if deviateRoute["totalProfit"] > straightRoute["totalProfit"] * 3:
-                    self.routeName = deviateRouteName
-                    self.route = deviateRoute
-            else:
-                self.routeName = deviateRouteName
-                self.route = deviateRoute
-
-
-    def calculate_with_deviation(self):
-        if not self.deviations:
-            return None
+        self.routeName, self.route = self.calculate()
+
+    # best route with 0 to maxStops stops, by credits per hour when leg times can be estimated
+    def calculate(self):
+        systems, search = self.create_stop_search()
+        return self.route_from_search(systems, search, search.best_rate())
+
+    def create_stop_search(self):
+        systems = [self.fromSystem] + self.order_deviations() + [self.toSystem]
+        maxStops = self.maxStops if self.deviations else 0
+        legSeconds = self.leg_seconds(systems) if self.jumpRange else None
+        search = trade.StopSearch([system.stationInfos for system in systems], self.cargoSpace, self.capital, maxStops, self.stopSeconds, legSeconds=legSeconds)
+        return systems, search
+
+    # (route name, route) of a StopSearch result, (None, None) without one
+    def route_from_search(self, systems, search, result):
+        if not result:
+            return None, None
+
+        score, profit, seconds, path = result
+        stops = [(systems[search.group_of(station)], search.stations[station]) for station in path]
+        legs = search.legs(path)
+        route = self.construct_route(stops, [items for items, legProfit in legs], profit)
+        if seconds is not None:
+            route["seconds"] = seconds
+            route["creditsPerHour"] = score
+        return self.route_name(stops), route
+
+    # leg time estimate for StopSearch: jumps between the two systems plus supercruise and docking at each target station
+    def leg_seconds(self, systems):
+        coords = np.array([coords_array(system) for system in systems]).reshape(-1, 3)
+        arrivals = []
+        for system in systems:
+            arrivals.append(np.array([np.nan if station.distanceToArrival is None else station.distanceToArrival
+                                      for station in system.stationInfos], dtype=np.float64))
 
-        # first calculate the forwards first
-        firstRouteDict = {}
-        for deviate in self.deviations:
-            curRouteDict = self.calcalate_between_2(self.fromSystem, deviate)
-            if curRouteDict:
-                firstRouteDict.update(curRouteDict)
-
-        # then loop thru the forwards and calculate from there to destination system
-        finalRouteDict = {}
-        for firstRoute in firstRouteDict:
-            # gather infos
-            oldRouteDict = firstRouteDict[firstRoute]
-
-            # calculate next route
-            fromSystem = self.create_copy_of_last_system(firstRoute, oldRouteDict)
-            curRouteDict = self.calcalate_between_2(fromSystem, self.toSystem)
-            if not curRouteDict:
-                continue
+        def seconds(source, target):
+            jumps = self.costModel.jumps(math.dist(coords[source], coords[target]), self.jumpRange)
+            return self.costModel.leg_seconds(jumps, arrivals[target])
+        return seconds
+
+    # deviations sorted by how far along the from -> to line they are
+    def order_deviations(self):
+        start = coords_array(self.fromSystem)
+        direction = coords_array(self.toSystem) - start
+        lengthSq = float(np.dot(direction, direction)) or 1.0
+        return sorted(self.deviations, key=lambda system: float(np.dot(coords_array(system) - start, direction)) / lengthSq)
 
-            # now combine and construct a new dict
-            for newRoute in curRouteDict:
-                newRouteName = firstRoute + " -> " + newRoute.split(" -> ")[-1]
-                newItems = oldRouteDict["items"] + curRouteDict[newRoute]["items"]
-                newProfit = oldRouteDict["totalProfit"] + curRouteDict[newRoute]["totalProfit"]
-                newSystems = oldRouteDict["system_objs"]
-                newSystems.append(self.toSystem)
-                finalRouteDict[newRouteName] = self.construct_route(newRouteName, newItems, newProfit, newSystems)
-
-        # done and return
-        return finalRouteDict
-
-    def calcalate_between_2(self, fromSystem: SystemInfo, toSystem: SystemInfo):
-        toStations = toSystem.stationInfos
-        fromStations = fromSystem.stationInfos
-
-        routeDict = {}
-        for toStat in toStations:
-            for fromStat in fromStations:
-                items, profit = self.get_profit_items(fromStat, toStat, self.cargoSpace, items=[], profit=0, excluded=[])
-                if items and profit > 0:
-                    routeName = "{}/{} -> {}/{}".format(fromSystem.name, fromStat.name, toSystem.name, toStat.name)
-                    routeDict[routeName] = self.construct_route(routeName, [items], profit, [fromSystem, toSystem])
-        return routeDict
-    
-    def get_profit_items(self, fromStat: StationInfo, toStat: StationInfo, cargoSpace: int, items: list=[], profit=0, excluded: list=[]):
-        highestItem, highestItemName, highestProfit = self.get_highest_profit_item(fromStat, toStat, excluded)
-        if highestItem:
-            curAvailableStock = fromStat.marketInfo.availableStock[highestItem]["stock"]
-            stockTaking = min(curAvailableStock, cargoSpace)
-            curProfit = highestProfit * stockTaking
-            items.append({
-                "itemId" : highestItem,
-                "itemName" : highestItemName,
-                "count" : stockTaking,
-                "profit" : curProfit
-            })
-            profit += curProfit
-            cargoSpace -= curAvailableStock
-            if cargoSpace > 0:
-                excluded.append(highestItem)
-                items, profit = self.get_profit_items(fromStat, toStat, cargoSpace, items, profit, excluded)
-        return items, profit
-
-    # item with highest profit in 2 stations
-    def get_highest_profit_item(self, fromStat: StationInfo, toStat: StationInfo, excluded: list=[]):
-        profit = 0
-        item = ""
-        itemName = ""
-        demandList = toStat.marketInfo.demandList
-        stockList = fromStat.marketInfo.availableStock
-        for itemKey in demandList:
-            if itemKey in stockList:
-                curProfit = demandList[itemKey]["sellPrice"] - stockList[itemKey]["buyPrice"]
-                if curProfit > profit and itemKey not in excluded:
-                    profit = curProfit
-                    item = itemKey
-                    itemName = demandList[itemKey]["name"]
-        return item, itemName, profit
-                
-    def pick_highest_profit_route(self, routeDict):
-        bestRoute = None
-        bestRouteName = None
-        profit = 0
-        for route in routeDict:
-            curProfit = routeDict[route]["totalProfit"]
-            if curProfit > profit:
-                profit = curProfit
-                bestRouteName = route
-                bestRoute = routeDict[route]
-        return bestRouteName, bestRoute
-    
     def parse_info(self):
         if not self.route:
             return "No Route found for {} to {}".format(self.fromSystem.name, self.toSystem.name)
         result = ""
-        stops = self.routeName.split(" -> ")
+        stops = self.route["stops"]
         previousProfit = 0
-        for id, stop in enumerate(stops):
-            result += stop + "\n"   # display stop name
+        for id, (system, station) in enumerate(stops):
+            result += "{}/{}\n".format(system.name, station.name)   # display stop name
             if id > 0:
                 result += "  Profit: {}\n".format(previousProfit)
             if id < len(stops)-1:
@@ -238,28 +292,49 @@ class RouteInfo:
                 for item in self.route["items"][id]:
                     result += "   BUY {} x{} \n".format(item["itemName"], item["count"])
                     previousProfit += item["profit"]
+        if "seconds" in self.route:
+            result += "Estimated {:.0f} min, {:.0f} credits/hour\n".format(self.route["seconds"] / 60, self.route["creditsPerHour"])
         return result
                 
     """
     Util functions
     """
-    def construct_route(self, routeName: str, items, totalProfit, systemList):
-        stationCount = len(routeName.split(" -> "))
+    # stops is the list of (SystemInfo, StationInfo) visited, items holds one list per leg
+    def construct_route(self, stops, items, totalProfit):
         route = {
             "items" : items,
             "totalProfit" : totalProfit,
-            "stations" : stationCount,
-            "system_objs" : systemList
+            "stations" : len(stops),
+            "stops" : stops,
+            "system_objs" : [system for system, station in stops]
         }
         return route
+
+    # json friendly summary of the route, None if there's none
+    def to_dict(self):
+        if not self.route:
+            return None
+        result = {
+            "from" : self.fromSystem.name,
+            "to" : self.toSystem.name,
+            "stops" : [{"system": system.name, "station": station.name} for system, station in self.route["stops"]],
+            "items" : self.route["items"],
+            "totalProfit" : int(self.route["totalProfit"]),
+        }
+        if "seconds" in self.route:
+            result["seconds"] = float(self.route["seconds"])
+            result["creditsPerHour"] = float(self.route["creditsPerHour"])
+        return result
+
+    def route_name(self, stops):
+        return " -> ".join("{}/{}".format(system.name, station.name) for system, station in stops)
     
-    def create_copy_of_last_system(self, lastRouteName, lastRoute):
-        stops = lastRouteName.split(" -> ")
-        lastStation = stops[-1].split("/")[-1]
+    def create_copy_of_last_system(self, lastRoute):
+        lastSystem, lastStation = lastRoute["stops"][-1]
 
         # calculate next route
-        lastSystem = lastRoute["system_objs"][-1].copy()   # get a copy of the last system_obj
-        lastSystem.isolate_station(lastStation)
+        lastSystem = lastSystem.copy()   # get a copy of the last system_obj
+        lastSystem.isolate_station(lastStation.name)
 
         return lastSystem
     
@@ -267,36 +342,72 @@ class RouteInfo:
 class RuntimeDatabase:
     def __init__(self):
         self.systems = []
-        self.system_names = set()
-
-        self.stations = []
-        self.station_names = set()
+        self.system_names = {}   # name -> SystemInfo
 
         self.b_has_collected_datas = False
 
+        # neighbor graph in CSR form: neighbors of systems[i] are
+        # systems[neighborIndices[neighborOffsets[i]:neighborOffsets[i+1]]]
+        self.neighborOffsets = np.zeros(1, dtype=np.int64)
+        self.neighborIndices = np.zeros(0, dtype=np.int32)
+
+        # lazy mode: (maxDist, minDist) and per system index cache of expanded neighbors
+        self.lazyRange = None
+        self.lazyNeighbors = {}
+
+    # neighbors are then queried from the api the first time a system is expanded
+    def enable_lazy_neighbors(self, maxDist, minDist=0):
+        self.lazyRange = (maxDist, minDist)
+        self.lazyNeighbors = {}
+
     def build_neighbors(self, maxDist, minDist=0):
-        for i in range(len(self.systems)):
-            for j in range(i + 1, len(self.systems)):  # Avoid duplicate checks
-                curDist = math.dist(list(self.systems[i].coords.values()), 
-                                    list(self.systems[j].coords.values()))
-                if curDist < maxDist and curDist > minDist:
-                    self.systems[i].add_neighbor(self.systems[j])
-                    self.systems[j].add_neighbor(self.systems[i])
+        xyz = np.array([[system.coords['x'], system.coords['y'], system.coords['z']] for system in self.systems],
+                       dtype=np.float64).reshape(-1, 3)
+        first, second = si.grid_pairs(xyz, maxDist, minDist)
+
+        # store both directions, grouped by source system
+        sources = np.concatenate([first, second])
+        targets = np.concatenate([second, first])
+        order = np.argsort(sources, kind="stable")
+        self.neighborIndices = targets[order].astype(np.int32)
+        self.neighborOffsets = np.zeros(len(self.systems) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.systems)), out=self.neighborOffsets[1:])
+
+    def get_neighbors(self, system : SystemInfo):
+        if self.lazyRange:
+            return self.expand_neighbors(system)
+        if system.index is None or system.index + 1 >= len(self.neighborOffsets):
+            return []
+        begin = self.neighborOffsets[system.index]
+        end = self.neighborOffsets[system.index + 1]
+        return [self.systems[i] for i in self.neighborIndices[begin:end]]
+
+    def expand_neighbors(self, system : SystemInfo):
+        if system.index in self.lazyNeighbors:
+            return self.lazyNeighbors[system.index]
+
+        maxDist, minDist = self.lazyRange
+        origin = list(system.coords.values())
+        nearbys = get_systems_in_radius(system.name, maxDist, self, coords=system.coords, minRadius=minDist, includeAnarchy=True)
+        result = []
+        for nearby in nearbys or []:
+            curDist = math.dist(origin, list(nearby.coords.values()))
+            if curDist < maxDist and curDist > minDist:
+                result.append(nearby)
+        self.lazyNeighbors[system.index] = result
+        return result
 
     def add_system(self, system : SystemInfo):
         if system.name not in self.system_names:
+            system.index = len(self.systems)
             self.systems.append(system)
-            self.system_names.add(system.name)
+            self.system_names[system.name] = system
             return system
         else:
-            for curSystem in self.systems:
-                if curSystem.name == system.name:
-                    return curSystem
+            return self.system_names[system.name]
 
-    def add_station(self, station : StationInfo):
-        if station.name not in self.station_names:
-            self.stations.append(station)
-            self.station_names.add(station.name)
+def coords_array(system : SystemInfo):
+    return np.array([system.coords['x'], system.coords['y'], system.coords['z']], dtype=np.float64)
 
 """
 putting the api functions here first for possible overriding later
@@ -305,9 +416,8 @@ def get_system_coord(systemName, database : RuntimeDatabase):
     if not database.b_has_collected_datas:
         return api.get_system_coord(systemName)
     
-    for system in database.systems:
-        if system.name == systemName:
-            return system.coords
+    if systemName in database.system_names:
+        return database.system_names[systemName].coords
         
     print("ERROR: Could not find coords in runtime database")
     return None
@@ -315,10 +425,14 @@ def get_system_coord(systemName, database : RuntimeDatabase):
 def is_system_anarchy(systemName):
     return api.is_system_anarchy(systemName)
 
+def is_system_anarchy_many(systemNames):
+    return api.is_system_anarchy_many(systemNames)
+
 def get_systems_in_radius(systemName, radius, database : RuntimeDatabase, coords=None, minRadius=None, includeAnarchy=False):
     parsedResult = []
 
-    if not database.b_has_collected_datas:
+    # with a spatial index the backend answers quickly, so it's used even after the corridor is collected
+    if not database.b_has_collected_datas or api.has_spatial_index():
         result =  api.get_systems_in_radius(systemName, radius, coords, minRadius, includeAnarchy)
 
         if not result:
@@ -353,9 +467,91 @@ def get_systems_in_radius(systemName, radius, database : RuntimeDatabase, coords
 
     return parsedResult
 
+# systems within width of the line between two coordinates, always asked from the api
+def get_systems_in_corridor(startCoords, targetCoords, width, database : RuntimeDatabase, includeAnarchy=False):
+    result = api.get_systems_in_corridor(startCoords, targetCoords, width, includeAnarchy)
+
+    parsedResult = []
+    for system in result:
+        systemInfo = SystemInfo(system["name"], coords=system["coords"], distance=system["distance"])
+        systemInfo = database.add_system(systemInfo)
+        parsedResult.append(systemInfo)
+    return parsedResult
+
 def get_stations(systemName, noPlanet=True):
     return api.get_stations(systemName, noPlanet)
 
+def get_station_distances(systemName):
+    return api.get_station_distances(systemName)
+
+def get_stations_many(systemNames, noPlanet=True):
+    return api.get_stations_many(systemNames, noPlanet)
+
+def get_station_distances_many(systemNames):
+    return api.get_station_distances_many(systemNames)
+
+def get_station_ids_many(locations):
+    return api.get_station_ids_many(locations)
+
+def get_market_data_many(locations):
+    return api.get_market_data_many(locations)
+
+def get_market_rows_many(locations):
+    return api.get_market_rows_many(locations)
+
+def get_dataset_version():
+    return api.get_dataset_version()
+
+def get_station_max_age():
+    return api.get_station_max_age()
+
+# also registers the price matrix commodities first, so trade columns line up with the matrix's
+def warm_up():
+    api.warm_up()
+    priceMatrix = api.get_price_matrix()
+    if priceMatrix is not None:
+        trade.commodity_columns.columns_of(priceMatrix.commodityIds, priceMatrix.commodityNames)
+
+# loads station lists (where not set yet), distances and markets of all systems in one batch per kind,
+# concurrent requests online and one pass over the market data offline
+# stations already in station_registry are reused instead of loaded again
+def gather_systems(systems):
+    systems = list({id(system): system for system in systems if not system.b_gathered}.values())
+    if not systems:
+        return
+
+    needNames = [system for system in systems if not system.stationToScan]
+    stationLists = get_stations_many([system.name for system in needNames])
+    for system in needNames:
+        system.stationToScan = stationLists.get(system.name) or []
+
+    station_registry.sync(get_dataset_version(), get_station_max_age())
+    locations = [(system.name, stationName) for system in systems for stationName in system.stationToScan]
+    stationIds = get_station_ids_many(locations)
+    known = {location: station_registry.get(stationIds[location]) for location in locations if stationIds.get(location) is not None}
+    missing = [location for location in locations if known.get(location) is None]
+
+    distances = get_station_distances_many(list(dict.fromkeys(systemName for systemName, stationName in missing)))
+    # markets in the price matrix go to the trade tables straight from their rows
+    priceMatrix, matrixRows = get_market_rows_many(missing)
+    sparseMarkets = {}
+    if matrixRows:
+        sparseMarkets = dict(zip(matrixRows, trade.sparse_matrix_markets(priceMatrix, list(matrixRows.values()))))
+    markets = get_market_data_many([location for location in missing if location not in sparseMarkets])
+    for system in systems:
+        systemDistances = distances.get(system.name) or {}
+        for stationName in system.stationToScan:
+            location = (system.name, stationName)
+            station = known.get(location)
+            if station is None:
+                # [] marks a station without market, so StationInfo doesn't look it up again
+                marketData = markets.get(location) or []
+                station = StationInfo(stationName, system.name, systemDistances.get(stationName), marketData, sparseMarkets.get(location))
+                if stationIds.get(location) is not None:
+                    station_registry.add(stationIds[location], station)
+            system.stationInfos.append(station)
+        system.b_gathered = True
+
 def get_market_data(systemName, stationName):
     return api.get_market_data(systemName, stationName)
 
@@ -363,9 +559,16 @@ def get_market_data(systemName, stationName):
 Main classes
 """
 class RoutePlanner:
-    def __init__(self, curSystemName: str, targetSystemName: str, jumpCapacity, database : RuntimeDatabase, minRange=0, calculate=True):
+    # lazy=True skips the up-front corridor gather and expands neighbors only for systems the search visits
+    # engine picks the search, "bfs" for bi_directional_bfs or "astar" for a_star
+    # corridorWidth is how far from the direct line systems are gathered (default corridor_jump_width jumps),
+    # 0 gathers the two full spheres around start and target instead
+    def __init__(self, curSystemName: str, targetSystemName: str, jumpCapacity, database : RuntimeDatabase, minRange=0, calculate=True, lazy=False, engine="bfs", corridorWidth=None):
         assert isinstance(jumpCapacity, int) or isinstance(jumpCapacity, float)
+        assert engine in route_engines
         self.database = database
+        self.jumpCapacity = jumpCapacity
+        self.engine = engine
         self.database.b_has_collected_datas = False
 
         self.system_route = []
@@ -387,32 +590,110 @@ class RoutePlanner:
         targetSystemInfo = SystemInfo(targetSystemName, coords=coords, distance=furthestDist)
         self.database.add_system(targetSystemInfo)
 
-        if calculate:
-            extendsFromCur = get_systems_in_radius(curSystemName, furthestDist, self.database, coords=curCoords, includeAnarchy=True)
-            extendsFromTar = get_systems_in_radius(targetSystemName, furthestDist, self.database, coords=coords, includeAnarchy=True)
-            self.database.b_has_collected_datas = True
-
-            self.database.build_neighbors(jumpCapacity, minRange)
-            self.bi_directional_bfs(curSystemInfo, targetSystemInfo)
+        if calculate and lazy:
+            # lazy expansion runs a radius search per system it reaches
+            if not api.has_fast_radius_search():
+                print("LOG: No system spatial index, lazy mode will scan every system for each system it expands.")
+            self.database.enable_lazy_neighbors(jumpCapacity, minRange)
+            self.search(curSystemInfo, targetSystemInfo)
+        elif calculate:
+            if corridorWidth is None:
+                corridorWidth = jumpCapacity * corridor_jump_width
+            self.gather_and_search(curSystemInfo, targetSystemInfo, furthestDist, corridorWidth, minRange)
         else:
             self.system_route.append(curSystemInfo)
             self.system_route.append(targetSystemInfo)
 
+    # gathers a corridor around the direct line and searches it, doubling the width while no route fits,
+    # then falls back to the two full spheres around start and target
+    def gather_and_search(self, startSystem: SystemInfo, targetSystem: SystemInfo, furthestDist, corridorWidth, minRange=0):
+        width = corridorWidth
+        while width and width < furthestDist:
+            print("LOG: Gathering systems within {} ly of the direct line.".format(width))
+            self.database.b_has_collected_datas = False
+            get_systems_in_corridor(startSystem.coords, targetSystem.coords, width, self.database, includeAnarchy=True)
+            self.database.b_has_collected_datas = True
+
+            self.database.build_neighbors(self.jumpCapacity, minRange)
+            self.search(startSystem, targetSystem)
+            if self.system_route:
+                return
+            width *= 2
+
+        self.database.b_has_collected_datas = False
+        extendsFromCur = get_systems_in_radius(startSystem.name, furthestDist, self.database, coords=startSystem.coords, includeAnarchy=True)
+        extendsFromTar = get_systems_in_radius(targetSystem.name, furthestDist, self.database, coords=targetSystem.coords, includeAnarchy=True)
+        self.database.b_has_collected_datas = True
+
+        self.database.build_neighbors(self.jumpCapacity, minRange)
+        self.search(startSystem, targetSystem)
+
+    def search(self, startSystem: SystemInfo, targetSystem: SystemInfo):
+        if self.engine == "astar":
+            self.a_star(startSystem, targetSystem)
+        else:
+            self.bi_directional_bfs(startSystem, targetSystem)
+
+    # A* over jump count, straight-line distance / jump range never overestimates the jumps left
+    def a_star(self, startSystem: SystemInfo, targetSystem: SystemInfo):
+        if startSystem.name == targetSystem.name:
+            return
+        targetCoords = list(targetSystem.coords.values())
+
+        def heuristic(system):
+            return math.ceil(math.dist(list(system.coords.values()), targetCoords) / self.jumpCapacity)
+
+        counter = 0   # tie breaker so the heap never compares SystemInfo objects
+        frontier = [(heuristic(startSystem), counter, startSystem)]
+        jumps = {startSystem.index: 0}
+        parents = {startSystem.index: None}   # index -> parent SystemInfo
+        closed = set()
+
+        while frontier:
+            _, _, node = heapq.heappop(frontier)
+            if node.index in closed:
+                continue
+            if node.index == targetSystem.index:
+                self.system_route = self.reconstruct_route(node, parents)
+                return
+            closed.add(node.index)
+
+            nextJumps = jumps[node.index] + 1
+            for neighbor in self.database.get_neighbors(node):
+                if neighbor.index in closed:
+                    continue
+                if neighbor.index in jumps and jumps[neighbor.index] <= nextJumps:
+                    continue
+                jumps[neighbor.index] = nextJumps
+                parents[neighbor.index] = node
+                counter += 1
+                heapq.heappush(frontier, (nextJumps + heuristic(neighbor), counter, neighbor))
+
+        print("ERROR: Failed to plan route!")
+
+    def reconstruct_route(self, lastSystem: SystemInfo, parents):
+        route = []
+        system = lastSystem
+        while system is not None:
+            route.append(system)
+            system = parents[system.index]
+        return route[::-1]
+
     def bi_directional_bfs(self, startSystem: SystemInfo, targetSystem: SystemInfo):
         if startSystem.name == targetSystem.name:
             return
         # Initialize two search fronts
         queue_start = deque([[startSystem]])  # BFS queue from start
         queue_end = deque([[targetSystem]])  # BFS queue from end
-        visited_start = {startSystem: None}  # Parent tracking for reconstruction
-        visited_end = {targetSystem: None}
+        visited_start = {startSystem: [startSystem]}  # path to each system, for reconstruction
+        visited_end = {targetSystem: [targetSystem]}
 
         while queue_start and queue_end:
             # Expand from the start
             path_start = queue_start.popleft()
             node_start = path_start[-1]
 
-            for neighbor in node_start.neighbors:
+            for neighbor in self.database.get_neighbors(node_start):
                 if neighbor in visited_end:
                     self.system_route = path_start + visited_end[neighbor][::-1]
                     return
@@ -424,7 +705,7 @@ class RoutePlanner:
             path_end = queue_end.popleft()
             node_end = path_end[-1]
 
-            for neighbor in node_end.neighbors:
+            for neighbor in self.database.get_neighbors(node_end):
                 if neighbor in visited_start:
                     self.system_route = visited_start[neighbor] + path_end[::-1]
                     return
@@ -518,12 +799,16 @@ class TripPlanner:
     def __init__(self):
         pass
 
-    def plan(self,  curLocation: str, targetLocation: str, jumpCapacity, minHop: int=1, deviation=2, cargoSpace: int=8, minRange=0):
+    def plan(self,  curLocation: str, targetLocation: str, jumpCapacity, minHop: int=1, deviation=2, cargoSpace: int=8, minRange=0, lazy=False, engine="bfs", corridorWidth=None, capital=None, maxStops=1, stopSeconds=0, costModel=None):
         # ensure input is correct
         assert isinstance(jumpCapacity, int) or isinstance(jumpCapacity, float)
         assert isinstance(deviation, int) or isinstance(deviation, float)
         assert isinstance(minRange, int) or isinstance(minRange, float)
         self.cargoSpace = cargoSpace
+        self.capital = capital
+        self.maxStops = maxStops
+        self.stopSeconds = stopSeconds
+        self.costModel = costModel or cm.CostModel()
         self.jumpCapacity = jumpCapacity
         self.deviation = deviation
 
@@ -535,7 +820,11 @@ class TripPlanner:
         self.database = RuntimeDatabase()
 
         # get neccessary stops
-        self.routePlanner = RoutePlanner(curSystem, targetSystem, jumpCapacity, self.database, minRange=minRange, calculate=minHop>0)
+        self.routePlanner = RoutePlanner(curSystem, targetSystem, jumpCapacity, self.database, minRange=minRange, calculate=minHop>0, lazy=lazy, engine=engine, corridorWidth=corridorWidth)
+        if not self.routePlanner.system_route:
+            print("ERROR: No route found from {} to {}!".format(curSystem, targetSystem))
+            self.routes = []
+            return
         print("LOG: Route planned.")
 
         # embbed stations into first and last system and generate their infos
@@ -545,14 +834,9 @@ class TripPlanner:
         assert isinstance(lastSystem, SystemInfo)
         if curStation:
             firstSystem.stationToScan = [curStation]
-        else:
-            firstSystem.get_all_stationNames()
         if targetStation:
             lastSystem.stationToScan = [targetStation]
-        else:
-            lastSystem.get_all_stationNames()
-        firstSystem.gather_station_infos()
-        lastSystem.gather_station_infos()
+        gather_systems([firstSystem, lastSystem])
         
         # proceed to calculate the plan
         self.routes = self.plan_trip(minHop)
@@ -587,42 +871,31 @@ class TripPlanner:
             if not section:
                 continue
 
-            # generate station data for start and end
-            for system in [section[0], section[-1]]:
-                if not system.stationToScan:
-                    system.get_all_stationNames()
-                    system.gather_station_infos()
-                else:
-                    if not system.stationInfos:
-                        system.gather_station_infos()
-            
-            # gather deviations
+            # collect in-betweens and deviations first, then load every station and market of the section at once
             if len(section) > 2:
                 print("LOG: Gathering in-betweens...")
-                for system in section[1:-1]:
-                    system.get_all_stationNames()
-                    system.gather_station_infos()
-                    deviations.append(system)
+                deviations = list(section[1:-1])
                 print("LOG: Gathering deviations...")
                 if self.deviation>0:
+                    curNames = set([x.name for x in deviations] + [section[0].name, section[-1].name])
                     for system in section[1:-1]:
                         nearbys = get_systems_in_radius(system.name, coords=system.coords, database=self.database, radius=self.jumpCapacity*self.deviation)
-                        curNames = [x.name for x in deviations] + [section[0].name, section[-1].name]
-                        for systemD in nearbys:
+                        for systemD in nearbys or []:
                             if systemD.name not in curNames:
-                                systemD.get_all_stationNames()
-                                systemD.gather_station_infos()
+                                curNames.add(systemD.name)
                                 deviations.append(systemD)
+            print("LOG: Loading stations and markets of {} systems...".format(len(deviations) + 2))
+            gather_systems([section[0], section[-1]] + deviations)
 
             print("LOG: Calculating trade route for section...")
-            newRoute = RouteInfo(section[0],section[-1], deviations, self.cargoSpace)
+            newRoute = RouteInfo(section[0],section[-1], deviations, self.cargoSpace, self.capital, self.maxStops, self.stopSeconds, self.costModel, self.jumpCapacity)
             print("LOG: Section calculated, printing...")
             self.print_route([newRoute])
             plannedRoutes.append(newRoute)
 
             # replace next section start with system of isolated station
             if id < len(system_sectioned)-2:
-                newSystem = newRoute.create_copy_of_last_system(newRoute.routeName, newRoute.route)
+                newSystem = newRoute.create_copy_of_last_system(newRoute.route)
                 system_sectioned[id+1][0] = newSystem
 
         return plannedRoutes
@@ -635,9 +908,10 @@ class TripPlanner:
     Util functions
     """
     def filter_non_anarchy(self, systems):
+        anarchy = is_system_anarchy_many([system.name for system in systems])
         result = []
         for system in systems:
-            if not is_system_anarchy(system.name):
+            if not anarchy[system.name]:
                 result.append(system)
         return result
     
@@ -0,0 +1,87 @@
+import sys
+import argparse
+
+# command line entry point, i.e `python ldt.py plan "Ubassi/Bloomfield Platform" Gilya --jump 18 --cargo 104`
+# only argparse is loaded up front, the planner (numpy, pandas, the dataset) is imported by the command that needs it
+
+def add_plan_arguments(parser):
+    parser.add_argument("origin", metavar="FROM", help="starting location, <systemName> or <systemName>/<stationName>")
+    parser.add_argument("destination", metavar="TO", help="final destination, same form as FROM")
+    parser.add_argument("--jump", type=float, required=True, help="jump range in ly (with cargo)")
+    parser.add_argument("--cargo", type=int, default=8, help="cargo space in t (default 8)")
+    parser.add_argument("--min-hop", type=int, default=1, help="split the route into this many sections (default 1)")
+    parser.add_argument("--deviation", type=float, default=2, help="how far off the route to look for stations, in jump ranges (default 2)")
+    parser.add_argument("--min-range", type=float, default=0, help="shortest jump allowed in ly (default 0)")
+    parser.add_argument("--capital", type=int, help="credits to spend on cargo per trade (default no limit)")
+    parser.add_argument("--max-stops", type=int, default=1, help="deviation stops a section's trade route may make (default 1)")
+    parser.add_argument("--stop-seconds", type=float, default=0, help="seconds added to a trade route's time for each stop it makes (default 0)")
+    parser.add_argument("--engine", choices=["bfs", "astar"], default="bfs", help="route search (default bfs)")
+    parser.add_argument("--corridor-width", type=float, help="how far from the direct line systems are gathered, in ly")
+    parser.add_argument("--lazy", action="store_true", help="look up systems around a stop only when the search reaches it")
+
+def run_plan(args):
+    from . import classes
+    tripPlanner = classes.TripPlanner()
+    tripPlanner.plan(args.origin, args.destination, args.jump, minHop=args.min_hop, deviation=args.deviation,
+                     cargoSpace=args.cargo, minRange=args.min_range, lazy=args.lazy, engine=args.engine,
+                     corridorWidth=args.corridor_width, capital=args.capital, maxStops=args.max_stops,
+                     stopSeconds=args.stop_seconds)
+    return 0 if tripPlanner.routes else 1
+
+# coordinates and stations of one system, straight from the offline indexes
+def run_system(args):
+    from . import offline_database as api
+    coords = api.get_system_coord(args.system)
+    if not coords:
+        return 1
+    print("{}: x {:.2f}, y {:.2f}, z {:.2f}".format(args.system, coords["x"], coords["y"], coords["z"]))
+    distances = api.get_station_distances(args.system)
+    for stationName in api.get_stations(args.system) or []:
+        distance = distances.get(stationName)
+        print("  {}{}".format(stationName, "" if distance is None else " ({:.0f} ls)".format(distance)))
+    return 0
+
+def run_serve(args):
+    from . import planner_service
+    planner_service.serve(args.host, args.port, args.socketPath)
+    return 0
+
+def run_update(args):
+    from . import offline_database_edsm
+    database = offline_database_edsm.OfflineDatabase_EDSM()
+    if args.incremental:
+        database.update_incremental()
+    else:
+        database.update_all()
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ldt", description="Plans trade routes along a long distance trip.")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    plan = commands.add_parser("plan", help="plan a trip with trades along the way")
+    add_plan_arguments(plan)
+    plan.set_defaults(run=run_plan)
+
+    system = commands.add_parser("system", help="show a system's coordinates and stations")
+    system.add_argument("system", metavar="SYSTEM")
+    system.set_defaults(run=run_system)
+
+    serve = commands.add_parser("serve", help="run the planner service (see readme)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--socket", dest="socketPath", help="serve on this unix socket instead of host/port")
+    serve.set_defaults(run=run_serve)
+
+    update = commands.add_parser("update", help="download and extract the offline database")
+    update.add_argument("--incremental", action="store_true", help="only apply the recent dumps on top of the current database")
+    update.set_defaults(run=run_update)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
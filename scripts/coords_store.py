@@ -0,0 +1,183 @@
+import os
+import json
+import mmap
+import shutil
+from array import array
+import numpy as np
+
+from .name_index import name_hash
+from .spatial_index import SystemBatch, distances_from, radius_mask, segment_distances
+
+# columnar system coordinate store, one flat binary file per column:
+#   ids.bin           int64   system id
+#   x.bin, y.bin, z.bin float32 coordinates
+#   name_offsets.bin  int64   N+1 offsets into names.bin
+#   names.bin         utf8 bytes of all names back to back
+#   name_hashes.bin   uint64  name_hash() of every name, feeds the name index
+column_files = {
+    "ids" : ("ids.bin", np.int64),
+    "x" : ("x.bin", np.float32),
+    "y" : ("y.bin", np.float32),
+    "z" : ("z.bin", np.float32),
+    "nameOffsets" : ("name_offsets.bin", np.int64),
+    "nameBlob" : ("names.bin", np.uint8),
+    "nameHashes" : ("name_hashes.bin", np.uint64),
+}
+flush_count = 65536
+scan_batch_size = 4194304
+
+def map_column(path, dtype):
+    # np.memmap refuses zero length files
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+# read-only, memory mapped view of the store, nothing is parsed on load
+class CoordsStore:
+    def __init__(self, path):
+        self.path = path
+        for attr in column_files:
+            fName, dtype = column_files[attr]
+            setattr(self, attr, map_column(os.path.join(path, fName), dtype))
+        self.nameMap = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_name(self, row):
+        begin = self.nameOffsets[row]
+        end = self.nameOffsets[row + 1]
+        return self.nameBlob[begin:end].tobytes().decode("utf8")
+
+    def get_coords(self, row):
+        return {"x": float(self.x[row]), "y": float(self.y[row]), "z": float(self.z[row])}
+
+    # rows whose name is exactly systemName, found with a byte search over the name blob
+    def find_rows(self, systemName):
+        if not len(self.nameBlob):
+            return []
+        if self.nameMap is None:
+            with open(os.path.join(self.path, column_files["nameBlob"][0]), 'rb') as f:
+                self.nameMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        target = systemName.encode("utf8")
+        rows = []
+        pos = self.nameMap.find(target)
+        while pos >= 0:
+            row = int(np.searchsorted(self.nameOffsets, pos, side="right")) - 1
+            if self.nameOffsets[row] == pos and self.nameOffsets[row + 1] == pos + len(target):
+                rows.append(row)
+            pos = self.nameMap.find(target, pos + 1)
+        return rows
+
+    # vectorized radius scan over the whole store, for when there's no spatial index
+    def query_batch(self, center, radius, minRadius=None):
+        center = np.asarray(center, dtype=np.float64)
+        batches = []
+        for begin in range(0, len(self), scan_batch_size):
+            end = min(begin + scan_batch_size, len(self))
+            xyz = np.stack([self.x[begin:end], self.y[begin:end], self.z[begin:end]], axis=1)
+            distances = distances_from(xyz, center)
+            mask = radius_mask(distances, radius, minRadius)
+            rows = np.flatnonzero(mask) + begin
+            batches.append(SystemBatch([self.get_name(row) for row in rows], xyz[mask], distances[mask]))
+        return SystemBatch.concat(batches)
+
+    # vectorized corridor scan, distances in the batch are from start
+    def capsule_batch(self, start, end, width):
+        start = np.asarray(start, dtype=np.float64)
+        end = np.asarray(end, dtype=np.float64)
+        batches = []
+        for begin in range(0, len(self), scan_batch_size):
+            stop = min(begin + scan_batch_size, len(self))
+            xyz = np.stack([self.x[begin:stop], self.y[begin:stop], self.z[begin:stop]], axis=1)
+            mask = segment_distances(xyz, start, end) <= width
+            rows = np.flatnonzero(mask) + begin
+            batches.append(SystemBatch([self.get_name(row) for row in rows], xyz[mask], distances_from(xyz[mask], start)))
+        return SystemBatch.concat(batches)
+
+# appends records to the column files in batches
+# append=True continues a finished store instead of starting a new one
+class CoordsStoreWriter:
+    def __init__(self, path, append=False):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        append = append and has_coords_store(path)
+        self.count = 0
+        self.nameEnd = 0
+        if append:
+            with open(os.path.join(path, "meta.json"), 'r', encoding ='utf8') as json_file:
+                self.count = json.load(json_file)["count"]
+            self.nameEnd = os.path.getsize(os.path.join(path, column_files["nameBlob"][0]))
+
+        # meta.json marks a finished store, remove it until this one is closed
+        metaFile = os.path.join(path, "meta.json")
+        if os.path.isfile(metaFile):
+            os.remove(metaFile)
+
+        self.files = {}
+        for attr in column_files:
+            self.files[attr] = open(os.path.join(path, column_files[attr][0]), 'ab' if append else 'wb')
+        if not append:
+            self.files["nameOffsets"].write(array("q", [0]).tobytes())
+        self.reset_buffers()
+
+    def reset_buffers(self):
+        self.ids = array("q")
+        self.x = array("f")
+        self.y = array("f")
+        self.z = array("f")
+        self.nameOffsets = array("q")
+        self.nameBlob = bytearray()
+        self.nameHashes = array("Q")
+
+    def add(self, id, name, x, y, z):
+        self.ids.append(id)
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.nameBlob += name.encode("utf8")
+        self.nameOffsets.append(self.nameEnd + len(self.nameBlob))
+        self.nameHashes.append(name_hash(name))
+        if len(self.ids) >= flush_count:
+            self.flush()
+
+    def flush(self):
+        for attr in column_files:
+            self.files[attr].write(bytes(getattr(self, attr)))
+        self.count += len(self.ids)
+        self.nameEnd += len(self.nameBlob)
+        self.reset_buffers()
+
+    def close(self):
+        self.flush()
+        for attr in self.files:
+            self.files[attr].close()
+        with open(os.path.join(self.path, "meta.json"), 'w', encoding ='utf8') as json_file:
+            json.dump({"count": self.count}, json_file)
+
+# concatenates finished shard stores, in the given order, into one store at path
+def merge_coords_stores(shardPaths, path):
+    writer = CoordsStoreWriter(path)
+    for shardPath in shardPaths:
+        shard = CoordsStore(shardPath)
+        for attr in column_files:
+            if attr == "nameOffsets":
+                # shift the shard's offsets behind the names already written, its leading 0 is dropped
+                offsets = np.asarray(shard.nameOffsets[1:], dtype=np.int64) + writer.nameEnd
+                writer.files[attr].write(offsets.tobytes())
+            else:
+                with open(os.path.join(shardPath, column_files[attr][0]), 'rb') as f:
+                    shutil.copyfileobj(f, writer.files[attr])
+        writer.count += len(shard)
+        writer.nameEnd += len(shard.nameBlob)
+    writer.close()
+
+def has_coords_store(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+def load_coords_store(path):
+    if not has_coords_store(path):
+        return None
+    return CoordsStore(path)
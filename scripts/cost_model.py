@@ -0,0 +1,37 @@
+import numpy as np
+
+# rough timings of a trade run, in seconds
+default_jump_seconds = 50          # charging, jumping and lining up the next jump
+default_dock_seconds = 150         # docking request, landing, trading and launching
+# supercruise from the arrival star grows roughly with the square root of the distance
+default_supercruise_base = 20
+default_supercruise_per_sqrt_ls = 2.0
+# used when a station's distance to arrival isn't known
+default_arrival_ls = 1000
+
+# time estimates for routes, so trades can be compared by credits per hour instead of raw profit
+# every function takes numpy arrays, so many candidates are priced at once
+class CostModel:
+    def __init__(self, jumpSeconds=default_jump_seconds, dockSeconds=default_dock_seconds,
+                 supercruiseBase=default_supercruise_base, supercruisePerSqrtLs=default_supercruise_per_sqrt_ls,
+                 unknownArrivalLs=default_arrival_ls):
+        self.jumpSeconds = jumpSeconds
+        self.dockSeconds = dockSeconds
+        self.supercruiseBase = supercruiseBase
+        self.supercruisePerSqrtLs = supercruisePerSqrtLs
+        self.unknownArrivalLs = unknownArrivalLs
+
+    # jumps needed to cover distances (ly) with jumpRange, at least one between different systems
+    def jumps(self, distances, jumpRange):
+        distances = np.asarray(distances, dtype=np.float64)
+        return np.where(distances > 0, np.maximum(np.ceil(distances / jumpRange), 1), 0)
+
+    # arrivalLs is the station's distance from the arrival star, nan where unknown
+    def supercruise_seconds(self, arrivalLs):
+        arrivalLs = np.asarray(arrivalLs, dtype=np.float64)
+        arrivalLs = np.where(np.isnan(arrivalLs), self.unknownArrivalLs, arrivalLs)
+        return self.supercruiseBase + self.supercruisePerSqrtLs * np.sqrt(np.maximum(arrivalLs, 0))
+
+    # seconds from undocking at one station to being docked at the next
+    def leg_seconds(self, jumps, arrivalLs):
+        return np.asarray(jumps, dtype=np.float64) * self.jumpSeconds + self.supercruise_seconds(arrivalLs) + self.dockSeconds
@@ -0,0 +1,154 @@
+import asyncio
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# statuses worth retrying, EDSM answers these when it's busy or restarting
+retry_statuses = {429, 500, 502, 503, 504}
+retry_marker = object()
+
+parse_dict = {
+    "+" : "%2B",
+}
+
+def url_parse(url):
+    result = ""
+    for x in url:
+        if x in parse_dict:
+            result += parse_dict[x]
+        else:
+            result += x
+    return result
+
+# runs a coroutine to completion from sync code, also inside an already running loop (i.e jupyter)
+def run_sync(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+# EDSM http client with a shared connection pool, bounded concurrency and retry with backoff
+# requests are blocking, so they run on a thread pool and asyncio only schedules them
+# with a ResponseCache, fresh entries skip the network and stale ones are answered while refreshed behind
+class EdsmClient:
+    def __init__(self, maxConcurrency=8, retries=3, backoff=0.5, timeout=30, cache=None):
+        self.maxConcurrency = maxConcurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=maxConcurrency, pool_maxsize=maxConcurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=maxConcurrency)
+
+        self.refreshing = set()
+        self.refreshLock = threading.Lock()
+
+    # blocking get, returns parsed json or None once retries are used up
+    def get_json(self, url):
+        url = url_parse(url)
+        b_cached, cached = self.from_cache(url)
+        if b_cached:
+            return cached
+
+        for attempt in range(self.retries + 1):
+            result = self.try_get_json(url)
+            if result is not retry_marker:
+                self.to_cache(url, result)
+                return result
+            if attempt < self.retries:
+                time.sleep(self.backoff * (2 ** attempt))
+        print("ERROR: Giving up on {}".format(url))
+        return None
+
+    async def fetch(self, url, semaphore):
+        url = url_parse(url)
+        b_cached, cached = self.from_cache(url)
+        if b_cached:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                result = await loop.run_in_executor(self.executor, self.try_get_json, url)
+            if result is not retry_marker:
+                self.to_cache(url, result)
+                return result
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+        print("ERROR: Giving up on {}".format(url))
+        return None
+
+    # single attempt, retry_marker when the request should be tried again
+    # only a busy server or a lost connection is worth another try, other errors and non json answers give None
+    def try_get_json(self, url):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            print("LOG: EDSM request failed for {}: {}".format(url, e))
+            return retry_marker
+        except requests.RequestException as e:
+            print("ERROR: EDSM request failed for {}: {}".format(url, e))
+            return None
+
+        if response.status_code in retry_statuses:
+            print("LOG: EDSM answered {} for {}".format(response.status_code, url))
+            return retry_marker
+        if response.status_code >= 400:
+            print("ERROR: EDSM answered {} for {}".format(response.status_code, url))
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            print("ERROR: EDSM answered {} with a body that isn't json".format(url))
+            return None
+
+    async def fetch_many(self, urls):
+        semaphore = asyncio.Semaphore(self.maxConcurrency)
+        return await asyncio.gather(*[self.fetch(url, semaphore) for url in urls])
+
+    # responses in the same order as urls, None for the ones that failed
+    def get_json_many(self, urls):
+        if not urls:
+            return []
+        return run_sync(self.fetch_many(list(urls)))
+
+    """
+    Cache functions
+    """
+    # returns (found, response), a stale hit also starts a background refresh
+    def from_cache(self, url):
+        if not self.cache:
+            return False, None
+        state, cached = self.cache.lookup(url)
+        if state == self.cache.STALE:
+            self.refresh_later(url)
+        return state != self.cache.MISS, cached
+
+    # empty answers (unknown system etc.) aren't kept, they may exist later
+    def to_cache(self, url, response):
+        if self.cache and response:
+            self.cache.store(url, response)
+
+    def refresh_later(self, url):
+        with self.refreshLock:
+            if url in self.refreshing:
+                return
+            self.refreshing.add(url)
+        self.executor.submit(self.refresh, url)
+
+    def refresh(self, url):
+        try:
+            result = self.try_get_json(url)
+            if result is not retry_marker:
+                self.to_cache(url, result)
+        finally:
+            with self.refreshLock:
+                self.refreshing.discard(url)
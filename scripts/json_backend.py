@@ -0,0 +1,73 @@
+import json
+import time
+import ijson
+
+# fastest first, ijson falls back to its pure python parser when no yajl library is around
+ijson_backends = ["yajl2_c", "yajl2_cffi", "yajl2", "python"]
+# progress is reported at most this often while extracting
+log_interval = 10.0
+
+def select_ijson_backend():
+    for name in ijson_backends:
+        try:
+            return ijson.get_backend(name)
+        except ImportError:
+            continue
+    return ijson
+
+# msgspec raises its own DecodeError, callers expect a ValueError like json.loads gives
+def msgspec_loads(msgspec):
+    def loads(data):
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e))
+    return loads
+
+# (name, dumps to bytes, loads from bytes) of the fastest json library installed
+def select_encoder():
+    try:
+        import orjson
+        return "orjson", orjson.dumps, orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        return "msgspec", msgspec.json.encode, msgspec_loads(msgspec)
+    except ImportError:
+        pass
+    return "json", lambda data: json.dumps(data).encode('utf8'), json.loads
+
+parser = select_ijson_backend()
+parser_name = getattr(parser, "backend_name", ijson.backend)
+encoder_name, dumps, loads = select_encoder()
+
+# streams the objects under prefix out of a binary file object, numbers as float like json.load
+def items(file, prefix="item"):
+    return parser.items(file, prefix, use_float=True)
+
+def describe():
+    return "parse {}, encode {}".format(parser_name, encoder_name)
+
+# counts extracted records and logs the rate now and then, to confirm the fast path is in use
+class RateLogger:
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.start = time.time()
+        self.lastLog = self.start
+        print("LOG: Extracting {} ({}).".format(label, describe()))
+
+    def tick(self, count=1):
+        self.count += count
+        now = time.time()
+        if now - self.lastLog >= log_interval:
+            self.lastLog = now
+            self.log(now)
+
+    def log(self, now):
+        elapsed = max(now - self.start, 1e-9)
+        print("LOG: {}: {} records, {:.0f} records/s".format(self.label, self.count, self.count / elapsed))
+
+    def close(self):
+        self.log(time.time())
@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+
+# 64 bit name hash, stable across runs unlike python's hash()
+def name_hash(name):
+    return int.from_bytes(hashlib.blake2b(name.encode("utf8"), digest_size=8).digest(), "little")
+
+# hash table over a column of name hashes
+# hashes are sorted and bucketed by their top bits, so a lookup reads one bucket (a few entries)
+class NameIndex:
+    def __init__(self, hashes, rows, buckets, meta):
+        self.hashes = hashes
+        self.rows = rows
+        self.buckets = buckets
+        self.shift = 64 - meta["bits"]
+
+    # candidate rows for name, callers still compare the stored name to rule out collisions
+    def lookup(self, name):
+        hashValue = name_hash(name)
+        bucket = hashValue >> self.shift
+        begin = int(self.buckets[bucket])
+        end = int(self.buckets[bucket + 1])
+        result = []
+        for pos in range(begin, end):
+            if int(self.hashes[pos]) == hashValue:
+                result.append(int(self.rows[pos]))
+        return result
+
+# numpy is imported by build and load only, name_hash and lookups stay cheap to import (see store_lookup)
+def build_name_index(hashes, path):
+    import numpy as np
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    bits = max(1, int(len(hashes)).bit_length() - 2)
+    rows = np.argsort(hashes, kind="stable")
+    sortedHashes = hashes[rows]
+    bucketOf = sortedHashes >> np.uint64(64 - bits)
+    buckets = np.searchsorted(bucketOf, np.arange((1 << bits) + 1, dtype=np.uint64), side="left")
+
+    np.save(os.path.join(path, "hashes.npy"), sortedHashes)
+    np.save(os.path.join(path, "rows.npy"), rows)
+    np.save(os.path.join(path, "buckets.npy"), buckets.astype(np.int64))
+    with open(os.path.join(path, "meta.json"), 'w', encoding ='utf8') as json_file:
+        json.dump({"bits": bits, "count": len(hashes)}, json_file)
+
+def has_name_index(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+# with store, an index built for a different number of systems isn't loaded
+def load_name_index(path, store=None):
+    if not has_name_index(path):
+        return None
+
+    with open(os.path.join(path, "meta.json"), 'r', encoding ='utf8') as json_file:
+        meta = json.load(json_file)
+    if store is not None and meta["count"] != len(store):
+        print("ERROR: System name index does not match the coords store.")
+        return None
+
+    import numpy as np
+    arrays = []
+    for name in ["hashes", "rows", "buckets"]:
+        arrays.append(np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+    return NameIndex(*arrays, meta)
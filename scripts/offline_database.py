@@ -1,15 +1,23 @@
 import os
+import json
 import shutil
-import requests
-import asyncio
-import time
-import math
-import pandas as pd
+import threading
+
+# numpy and the modules built on it are imported where they're used, commands that only
+# read the json files or look up a system (see store_lookup) start without them
+from . import store_lookup
 
 offline_database_path = os.path.abspath("./database")
 populated_system_file = os.path.join(offline_database_path, "populated_system.json")
+system_stations_file = os.path.join(offline_database_path, "system_stations.json")
 station_market_path = os.path.join(offline_database_path, "station_market")
+station_market_index_file = os.path.join(offline_database_path, "station_market_index.json")
 system_coords_path = os.path.join(offline_database_path, "system_coords")
+system_coords_store_path = os.path.join(offline_database_path, "system_coords_bin")
+system_index_path = os.path.join(offline_database_path, "system_index")
+system_name_index_path = os.path.join(offline_database_path, "system_name_index")
+station_prices_path = os.path.join(offline_database_path, "station_prices")
+dataset_version_file = os.path.join(offline_database_path, "dataset_version.json")
 
 class SystemCoordsIterator:
     def __init__(self):
@@ -23,12 +31,12 @@ class SystemCoordsIterator:
         if self._index < len(self._sequence):
             fName = self._sequence[self._index]
             file = os.path.join(system_coords_path, fName)
-            df = pd.read_json(file)
+            df = read_json_df(file)
             self._index += 1
             return df
         else:
             raise StopIteration
-        
+
 class StationMarketIterator:
     def __init__(self):
         self._sequence = os.listdir(station_market_path)
@@ -41,23 +49,61 @@ class StationMarketIterator:
         if self._index < len(self._sequence):
             fName = self._sequence[self._index]
             file = os.path.join(station_market_path, fName)
-            df = pd.read_json(file)
+            df = read_json_df(file)
             self._index += 1
             return df
         else:
             raise StopIteration
+
+
+def load_json(file):
+    with open(file, 'r', encoding ='utf8') as json_file:
+        return json.load(json_file)
+
+# pandas is only needed for the json dataframes, it's imported here to keep startup quick
+def read_json_df(file):
+    import pandas as pd
+    return pd.read_json(file)
         
+# memory mapped dataset parts OfflineDatabase loads on first use
+lazy_attributes = ["coordsStore", "spatialIndex", "nameIndex"]
+
 # file manager class for syncing and managing database files
 class OfflineDatabase:
     def __init__(self, rawPath):
         self.datasetPath = offline_database_path
         self.rawDatasetPath = rawPath
         self.populated_system_file = populated_system_file
+        self.system_stations_file = system_stations_file
         self.station_market_path = station_market_path
+        self.station_market_index_file = station_market_index_file
         self.system_coords_path = system_coords_path
-        self.ensure_directories([self.datasetPath, self.rawDatasetPath, self.system_coords_path])
+        self.system_coords_store_path = system_coords_store_path
+        self.system_index_path = system_index_path
+        self.system_name_index_path = system_name_index_path
+        self.station_prices_path = station_prices_path
+        self.dataset_version_file = dataset_version_file
+        self.loadLock = threading.RLock()
+        self.ensure_directories([self.datasetPath, self.rawDatasetPath, self.system_coords_path, self.station_market_path])
         self.isValid = self.ensure_files()
-        
+        self.fileCache = {}
+
+    # coordsStore, spatialIndex and nameIndex are mapped on first use, once even when threads ask at the same time
+    # (reentrant, the indexes read coordsStore while they load)
+    def __getattr__(self, name):
+        if name not in lazy_attributes:
+            raise AttributeError(name)
+        with self.loadLock:
+            if name not in self.__dict__:
+                if name == "coordsStore":
+                    from . import coords_store as cs
+                    self.coordsStore = cs.load_coords_store(self.system_coords_store_path)
+                elif name == "spatialIndex":
+                    self.spatialIndex = self.load_spatial_index()
+                else:
+                    self.nameIndex = self.load_name_index()
+        return self.__dict__[name]
+
     def ensure_directories(self, pathList):
         for path in pathList:
             self.ensure_directory(path)
@@ -76,26 +122,116 @@ class OfflineDatabase:
             result = False
             print ("Error: Station Market not found, please check Readme.md for how to obtain it.")
 
-        if len(os.listdir(self.system_coords_path)) <= 0:
+        if len(os.listdir(self.system_coords_path)) <= 0 and store_lookup.read_meta(self.system_coords_store_path) is None:
             result = False
             print ("Error: System Coords not found, please check Readme.md for how to obtain it.")
         return result
 
+    # loads file through loader once and keeps the result until the file changes on disk
+    def load_cached(self, file, loader, key=None):
+        if not os.path.isfile(file):
+            return None
+        stat = os.stat(file)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cacheKey = (file, key)
+        if cacheKey in self.fileCache and self.fileCache[cacheKey][0] == version:
+            return self.fileCache[cacheKey][1]
+        data = loader(file)
+        self.fileCache[cacheKey] = (version, data)
+        return data
+
+    def invalidate_cache(self, file):
+        for cacheKey in list(self.fileCache):
+            if cacheKey[0] == file:
+                del self.fileCache[cacheKey]
+
     def get_populated_systems(self):
-        if not os.path.isfile(self.populated_system_file):
+        populatedSystem = self.load_cached(self.populated_system_file, read_json_df)
+        if populatedSystem is None:
             return (None, None)
-        return True, pd.read_json(self.populated_system_file)
+        return True, populatedSystem
+
+    # names of every system with a market, i.e. everything that isn't anarchy
+    def get_non_anarchy_names(self):
+        if os.path.isfile(self.system_stations_file):
+            return self.load_cached(self.system_stations_file, lambda file: frozenset(self.get_system_stations()), "names")
+        b_gotPopulatedSystem, populatedSystem = self.get_populated_systems()
+        if not b_gotPopulatedSystem:
+            return None
+        return self.load_cached(self.populated_system_file, lambda file: frozenset(populatedSystem["name"]), "names")
     
+    # system name -> station list, from the extractor's index
+    def get_system_stations(self):
+        return self.load_cached(self.system_stations_file, load_json)
+
+    # station id -> [market file, byte offset, byte length]
+    def get_market_index(self):
+        return self.load_cached(self.station_market_index_file, load_json)
+
+    # memory mapped (stations x commodities) price tables, reloaded once rebuilt
+    def get_price_matrix(self):
+        from . import price_matrix as pm
+        return self.load_cached(os.path.join(self.station_prices_path, "meta.json"),
+                                lambda file: pm.load_price_matrix(self.station_prices_path))
+
+    # {"version": n, "marketWatermark": latest market update time, ...}, bumped on every update
+    def get_dataset_version(self):
+        version = self.load_cached(self.dataset_version_file, load_json)
+        if version is None:
+            return {"version": 0}
+        return version
+
+    # reads a single station record out of a market file
+    def read_market_record(self, entry):
+        fName, offset, length = entry
+        with open(os.path.join(self.station_market_path, fName), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    # reads many station records, opening each market file once, returns them in the order of entries
+    def read_market_records(self, entries):
+        result = [None] * len(entries)
+        byFile = {}
+        for id, (fName, offset, length) in enumerate(entries):
+            byFile.setdefault(fName, []).append((offset, length, id))
+        for fName in byFile:
+            with open(os.path.join(self.station_market_path, fName), 'rb') as f:
+                for offset, length, id in sorted(byFile[fName]):
+                    f.seek(offset)
+                    result[id] = json.loads(f.read(length))
+        return result
+
     def get_station_market(self):
         return StationMarketIterator()
     
+    # the json system coords files, only read when there's no coords store
     def get_system_coords(self):
         return SystemCoordsIterator()
 
+    # an index left from an older store is rebuilt, it would point at the wrong rows
+    def load_name_index(self):
+        from . import name_index as ni
+        if not ni.has_name_index(self.system_name_index_path) or self.coordsStore is None:
+            return None
+        nameIndex = ni.load_name_index(self.system_name_index_path, self.coordsStore)
+        if nameIndex is None:
+            print("LOG: Rebuilding system name index...")
+            ni.build_name_index(self.coordsStore.nameHashes, self.system_name_index_path)
+            nameIndex = ni.load_name_index(self.system_name_index_path, self.coordsStore)
+        return nameIndex
+
+    def load_spatial_index(self):
+        from . import spatial_index as si
+        if not si.has_spatial_index(self.system_index_path) or self.coordsStore is None:
+            print("LOG: System spatial index not found, radius searches will scan the system coords files.")
+            return None
+        return si.load_spatial_index(self.system_index_path, self.coordsStore)
+
     def download_file(self, url):
         local_filename = self.file_from_url(url)
         path = os.path.join(self.rawDatasetPath, local_filename)
         print("LOG: Downloading {} to {}".format(url, path))
+        import requests
         with requests.get(url, stream=True) as r:
             with open(path, 'wb') as f:
                 shutil.copyfileobj(r.raw, f)
@@ -111,7 +247,59 @@ class OfflineDatabase:
         filename = url.split('/')[-1]
         return filename
     
-OD = OfflineDatabase(offline_database_path)
+# stands in for the OfflineDatabase, which is only created (and the dataset checked) on first use
+class LazyOfflineDatabase:
+    def __init__(self, path):
+        self.path = path
+        self.database = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def get(self):
+        if self.database is None:
+            with self.lock:
+                if self.database is None:
+                    self.database = OfflineDatabase(self.path)
+        return self.database
+
+OD = LazyOfflineDatabase(offline_database_path)
+
+# (n, 3) array out of a column of {"x", "y", "z"} dicts
+def coords_to_numpy(coords):
+    import numpy as np
+    return np.array([[coord["x"], coord["y"], coord["z"]] for coord in coords], dtype=np.float64).reshape(-1, 3)
+
+# price tables of every offline market, None if they haven't been built
+def get_price_matrix():
+    return OD.get_price_matrix()
+
+# loads the lookup tables a plan reads up front, so a long running process answers from memory
+def warm_up():
+    if OD.get_system_stations() is None:
+        OD.get_populated_systems()
+    OD.get_non_anarchy_names()
+    OD.get_market_index()
+    OD.get_price_matrix()
+    for name in lazy_attributes:
+        getattr(OD, name)
+
+# bumped by every update, anything cached from the dataset is stale once it changes
+def get_dataset_version():
+    return OD.get_dataset_version()["version"]
+
+# stations kept in memory stay valid until the dataset version changes
+def get_station_max_age():
+    return None
+
+# true if radius searches are served by the spatial index
+def has_spatial_index():
+    return OD.spatialIndex is not None
+
+# true if a radius search doesn't scan every system, lazy neighbor expansion runs one per system
+def has_fast_radius_search():
+    return has_spatial_index()
 
 # returns system coordinate value
 def get_system_coord(systemName):
@@ -119,7 +307,25 @@ def get_system_coord(systemName):
         print("ERROR: Need system name to get coordinate!")
         return None
     
+    # a matching name index finds the system with a few file reads, nothing has to be mapped
+    if store_lookup.has_lookup(OD.system_coords_store_path, OD.system_name_index_path):
+        coords = store_lookup.lookup_system_coords(OD.system_coords_store_path, OD.system_name_index_path, systemName)
+        if not coords:
+            print("ERROR: Couldn't find system!")
+        return coords
+
     coords = None
+    if OD.coordsStore is not None:
+        if OD.nameIndex is not None:
+            rows = [row for row in OD.nameIndex.lookup(systemName) if OD.coordsStore.get_name(row) == systemName]
+        else:
+            rows = OD.coordsStore.find_rows(systemName)
+        if rows:
+            coords = OD.coordsStore.get_coords(rows[0])
+        else:
+            print("ERROR: Couldn't find system!")
+        return coords
+
     systemCoords = OD.get_system_coords()
     for df in systemCoords:
         filteredDf = df[df["name"] == systemName]
@@ -138,21 +344,28 @@ def is_system_anarchy(systemName):
     if not systemName:
         print("ERROR: Need system name to find if anarchy!")
         return None
-    
-    b_gotPopulatedSystem, populatedSystem = OD.get_populated_systems()
 
-    if not b_gotPopulatedSystem:
+    nonAnarchyNames = OD.get_non_anarchy_names()
+
+    if nonAnarchyNames is None:
         print("ERROR: Failed getting populated system!")
         return True
     
-    filteredDf = populatedSystem[populatedSystem["name"] == systemName]
-    if len(filteredDf.index):
-        return False
-    else:
-        return True
+    return systemName not in nonAnarchyNames
     
-# returns list of all systems in radius of a given system
-def get_systems_in_radius(systemName, radius, coords=None, minRadius=None, includeAnarchy=False):
+# returns dict of system name -> true if anarchy
+# the name set is resolved once for the whole batch, not stat'ed again per name
+def is_system_anarchy_many(systemNames):
+    nonAnarchyNames = OD.get_non_anarchy_names()
+
+    if nonAnarchyNames is None:
+        print("ERROR: Failed getting populated system!")
+        return {systemName: True for systemName in systemNames}
+
+    return {systemName: systemName not in nonAnarchyNames for systemName in systemNames}
+
+# returns SystemBatch of all systems in radius of a given system
+def get_systems_in_radius_batch(systemName, radius, coords=None, minRadius=None, includeAnarchy=False):
     if not systemName:
         print("ERROR: Need system name to find nearby!")
         raise
@@ -164,64 +377,115 @@ def get_systems_in_radius(systemName, radius, coords=None, minRadius=None, inclu
         print("ERROR: Could not find coordinate for origin!")
         raise
 
-    originX = coords['x']
-    originY = coords['y']
-    originZ = coords['z']
-    result = []
-    systemCoords = OD.get_system_coords()
-    for df in systemCoords:
-        dfInRange = df[
-            (df.coords.apply(lambda entry: entry['x'] >= originX - radius*0.5)) & 
-            (df.coords.apply(lambda entry: entry['x'] <= originX + radius*0.5)) &
-            (df.coords.apply(lambda entry: entry['y'] >= originY - radius*0.5)) & 
-            (df.coords.apply(lambda entry: entry['y'] <= originY + radius*0.5)) &
-            (df.coords.apply(lambda entry: entry['z'] >= originZ - radius*0.5)) & 
-            (df.coords.apply(lambda entry: entry['z'] <= originZ + radius*0.5)) 
-            ]
-
-        if minRadius:
-            dfInRange_filtered = dfInRange[
-            (df.coords.apply(lambda entry: entry['x'] >= originX + minRadius*0.5)) & 
-            (df.coords.apply(lambda entry: entry['x'] <= originX - minRadius*0.5)) &
-            (df.coords.apply(lambda entry: entry['y'] >= originY + minRadius*0.5)) & 
-            (df.coords.apply(lambda entry: entry['y'] <= originY - minRadius*0.5)) &
-            (df.coords.apply(lambda entry: entry['z'] >= originZ + minRadius*0.5)) & 
-            (df.coords.apply(lambda entry: entry['z'] <= originZ - minRadius*0.5)) 
-            ]
-            dfInRange = dfInRange_filtered
-
-        for index, row in dfInRange.iterrows():
-            if not includeAnarchy:
-                if is_system_anarchy(row['name']):
-                    continue
-            result.append(
-                {"name": row['name'], 
-                    "coords": row['coords'], 
-                    "distance": math.dist([originX, originY, originZ], [row['coords']['x'], row['coords']['y'], row['coords']['z']])
-                }
-                )
+    import numpy as np
+    from . import spatial_index as si
+    origin = np.array([coords['x'], coords['y'], coords['z']], dtype=np.float64)
 
-    return result
+    if OD.spatialIndex:
+        batch = OD.spatialIndex.query_batch(origin, radius, minRadius)
+    elif OD.coordsStore is not None:
+        batch = OD.coordsStore.query_batch(origin, radius, minRadius)
+    else:
+        batches = []
+        systemCoords = OD.get_system_coords()
+        for df in systemCoords:
+            xyz = coords_to_numpy(df.coords)
+            distances = si.distances_from(xyz, origin)
+            mask = si.radius_mask(distances, radius, minRadius)
+            batches.append(si.SystemBatch(df["name"][mask].tolist(), xyz[mask], distances[mask]))
+        batch = si.SystemBatch.concat(batches)
+
+    if not includeAnarchy:
+        batch = filter_anarchy(batch)
+
+    return batch
+
+# returns list of all systems in radius of a given system
+def get_systems_in_radius(systemName, radius, coords=None, minRadius=None, includeAnarchy=False):
+    return get_systems_in_radius_batch(systemName, radius, coords, minRadius, includeAnarchy).to_list()
+
+# returns SystemBatch of all systems within width of the line from startCoords to targetCoords,
+# distances are measured from startCoords
+def get_systems_in_corridor_batch(startCoords, targetCoords, width, includeAnarchy=False):
+    import numpy as np
+    from . import spatial_index as si
+    start = np.array([startCoords['x'], startCoords['y'], startCoords['z']], dtype=np.float64)
+    end = np.array([targetCoords['x'], targetCoords['y'], targetCoords['z']], dtype=np.float64)
+
+    if OD.spatialIndex:
+        batch = OD.spatialIndex.capsule_batch(start, end, width)
+    elif OD.coordsStore is not None:
+        batch = OD.coordsStore.capsule_batch(start, end, width)
+    else:
+        batches = []
+        systemCoords = OD.get_system_coords()
+        for df in systemCoords:
+            xyz = coords_to_numpy(df.coords)
+            mask = si.segment_distances(xyz, start, end) <= width
+            batches.append(si.SystemBatch(df["name"][mask].tolist(), xyz[mask], si.distances_from(xyz[mask], start)))
+        batch = si.SystemBatch.concat(batches)
+
+    if not includeAnarchy:
+        batch = filter_anarchy(batch)
+
+    return batch
+
+# returns list of all systems within width of the line between two coordinates
+def get_systems_in_corridor(startCoords, targetCoords, width, includeAnarchy=False):
+    return get_systems_in_corridor_batch(startCoords, targetCoords, width, includeAnarchy).to_list()
+
+def filter_anarchy(batch):
+    nonAnarchyNames = OD.get_non_anarchy_names() or frozenset()
+    return batch.filter([name in nonAnarchyNames for name in batch.names])
+
+# returns (found, station list) of a populated system
+def get_populated_stations(systemName):
+    systemStations = OD.get_system_stations()
+    if systemStations is not None:
+        if systemName not in systemStations:
+            print("ERROR: Couldn't find system in PopulatedSystem!")
+            return False, None
+        return True, systemStations[systemName]
 
-# returns list of all stations of the system
-def get_stations(systemName, noPlanet=True):
-    if not systemName:
-        print("ERROR: Need system name to find stations!")
-        return None
-    
     b_gotPopulatedSystem, populatedSystem = OD.get_populated_systems()
 
     if not b_gotPopulatedSystem:
         print("ERROR: Failed getting populated system!")
-        return None
+        return False, None
 
     filteredDf = populatedSystem[populatedSystem["name"] == systemName]
     if not len(filteredDf.index):
         print("ERROR: Couldn't find system in PopulatedSystem!")
-        return None
+        return False, None
     
     systemEntry = filteredDf.iloc[0]
-    stations = systemEntry['stations']
+    return True, systemEntry['stations']
+
+# station name -> distance from the arrival star (ls), for stations where it was extracted
+def get_station_distances(systemName):
+    systemStations = OD.get_system_stations()
+    if systemStations is None or systemName not in systemStations:
+        return {}
+    result = {}
+    for station in systemStations[systemName]:
+        if station.get("distanceToArrival") is not None:
+            result[station["name"]] = station["distanceToArrival"]
+    return result
+
+# returns dict of system name -> station distances
+def get_station_distances_many(systemNames):
+    return {systemName: get_station_distances(systemName) for systemName in dict.fromkeys(systemNames)}
+
+# returns list of all stations of the system
+def get_stations(systemName, noPlanet=True):
+    if not systemName:
+        print("ERROR: Need system name to find stations!")
+        return None
+    
+    b_foundSystem, stations = get_populated_stations(systemName)
+
+    if not b_foundSystem:
+        return None
     
     if not stations:
         return None
@@ -239,26 +503,21 @@ def get_stations(systemName, noPlanet=True):
 
     return result
 
+# returns dict of system name -> station names
+def get_stations_many(systemNames, noPlanet=True):
+    return {systemName: get_stations(systemName, noPlanet) for systemName in dict.fromkeys(systemNames)}
+
 # return station ID
 def get_stationID(systemName, stationName):
     if not systemName:
         print("ERROR: Need system name to find stations!")
         return None
     
-    b_gotPopulatedSystem, populatedSystem = OD.get_populated_systems()
+    b_foundSystem, stations = get_populated_stations(systemName)
 
-    if not b_gotPopulatedSystem:
-        print("ERROR: Failed getting populated system!")
+    if not b_foundSystem:
         return None
     
-    filteredDf = populatedSystem[populatedSystem["name"] == systemName]
-    if not len(filteredDf.index):
-        print("ERROR: Couldn't find system in PopulatedSystem!")
-        return None
-    
-    systemEntry = filteredDf.iloc[0]
-    stations = systemEntry['stations']
-    
     if not stations:
         print("ERROR: Could not find station")
         return None
@@ -283,6 +542,20 @@ def get_market_data(systemName, stationName):
 
     if station_id == None:
         return None
+
+    priceMatrix = OD.get_price_matrix()
+    if priceMatrix is not None:
+        row = priceMatrix.row_of(station_id)
+        if row is not None:
+            return priceMatrix.market_data(row)
+
+    marketIndex = OD.get_market_index()
+    if marketIndex is not None:
+        entry = marketIndex.get(str(station_id))
+        if not entry:
+            print("ERROR: Could not find station market")
+            return None
+        return OD.read_market_record(entry)["commodities"]
     
     station_market = OD.get_station_market()
     b_foundEntry = False
@@ -298,4 +571,70 @@ def get_market_data(systemName, stationName):
         print("ERROR: Could not find station market")
         return None
 
-    return station_entry["commodities"]
\ No newline at end of file
+    return station_entry["commodities"]
+
+# returns dict of (systemName, stationName) -> station id, None where not found
+def get_station_ids_many(locations):
+    locations = list(dict.fromkeys(locations))
+    stationIds = {}
+    for systemName in dict.fromkeys(systemName for systemName, stationName in locations):
+        b_foundSystem, stations = get_populated_stations(systemName)
+        for station in (stations if b_foundSystem else None) or []:
+            stationIds[(systemName, station["name"])] = station["id"]
+    return {location: stationIds.get(location) for location in locations}
+
+# (price matrix, dict of (systemName, stationName) -> matrix row) for the stations the matrix has,
+# (None, {}) when it hasn't been built
+def get_market_rows_many(locations):
+    priceMatrix = OD.get_price_matrix()
+    if priceMatrix is None:
+        return None, {}
+    locations = list(dict.fromkeys(locations))
+    stationIds = get_station_ids_many(locations)
+    known = [location for location in locations if stationIds[location] is not None]
+    if not known:
+        return priceMatrix, {}
+    rows = priceMatrix.rows_of([stationIds[location] for location in known])
+    return priceMatrix, {location: row for location, row in zip(known, rows.tolist()) if row >= 0}
+
+# returns dict of (systemName, stationName) -> market data, None where not found
+def get_market_data_many(locations):
+    locations = list(dict.fromkeys(locations))
+    stationIds = get_station_ids_many(locations)
+    markets = get_markets_by_id([stationId for stationId in stationIds.values() if stationId is not None])
+    return {location: markets.get(stationIds[location]) for location in locations}
+
+# returns dict of station id -> market data for the ids that were found
+# served from the price matrix, else from the market index with each file opened once,
+# else with a single pass over the market files
+def get_markets_by_id(stationIds):
+    missing = list(dict.fromkeys(stationIds))
+    result = {}
+
+    priceMatrix = OD.get_price_matrix()
+    if priceMatrix is not None and missing:
+        rows = priceMatrix.rows_of(missing)
+        found = [(stationId, row) for stationId, row in zip(missing, rows.tolist()) if row >= 0]
+        for (stationId, row), market in zip(found, priceMatrix.market_data_many([row for stationId, row in found])):
+            result[stationId] = market
+        missing = [stationId for stationId in missing if stationId not in result]
+
+    marketIndex = OD.get_market_index()
+    if marketIndex is not None and missing:
+        indexed = [stationId for stationId in missing if str(stationId) in marketIndex]
+        records = OD.read_market_records([marketIndex[str(stationId)] for stationId in indexed])
+        for stationId, record in zip(indexed, records):
+            result[stationId] = record["commodities"]
+        missing = [stationId for stationId in missing if stationId not in result]
+
+    if marketIndex is None and missing:
+        remaining = set(missing)
+        for df in OD.get_station_market():
+            filteredDf = df[df["id"].isin(remaining)]
+            for stationId, commodities in zip(filteredDf["id"], filteredDf["commodities"]):
+                result[int(stationId)] = commodities
+                remaining.discard(int(stationId))
+            if not remaining:
+                break
+
+    return result
@@ -1,23 +1,86 @@
 import os
-import ijson
 import json
 import gzip
+import time
 import shutil
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 from . import offline_database as od
+from . import coords_store as cs
+from . import name_index as ni
+from . import spatial_index as si
+from . import json_backend as jb
+from . import price_matrix as pm
 
 urls = {
     "system_coords_url" : "	https://www.edsm.net/dump/systemsWithCoordinates.json.gz",
     "populated_system_url" : "https://www.edsm.net/dump/systemsPopulated.json.gz",
-    "stations_url" : "	https://www.edsm.net/dump/stations.json.gz"
+    "stations_url" : "	https://www.edsm.net/dump/stations.json.gz",
+    # systems added or updated in the last 7 days, for update_incremental
+    "system_coords_7days_url" : "https://www.edsm.net/dump/systemsWithCoordinates7days.json.gz"
 }
 offline_database_path_raw = os.path.abspath("./database_raw_edsm")
+# systems dump lines per parallel parsing shard
+shard_count = 262144
+# incremental updates merge their market delta files into one past either limit,
+# so the files and the records later updates replaced don't pile up
+max_market_deltas = 8
+max_superseded_delta_bytes = 256 * 1024 * 1024
 
 class OfflineDatabase_EDSM(od.OfflineDatabase):
-    def __init__(self):
+    # writeCoordsJson also writes the old system_coords_*.json chunks next to the binary store
+    def __init__(self, writeCoordsJson=False):
         self.urlDict = urls
+        self.writeCoordsJson = writeCoordsJson
         od.OfflineDatabase.__init__(self, offline_database_path_raw)
 
+    # downloads the three dumps at once and extracts each as soon as it's there, in a process pool
+    # the systems dump is also split into shards that are parsed in parallel
+    def update_all(self, workers=None):
+        workers = workers or os.cpu_count() or 1
+        extractions = {
+            "populated_system_url" : "extract_populated_systems",
+            "system_coords_url" : "extract_system_coords",
+            "stations_url" : "extract_stations",
+        }
+        files = {}
+        for key in extractions:
+            files[key] = os.path.join(self.rawDatasetPath, self.file_from_url(self.urlDict[key]))
+
+        # workers are spawned, forking this process while the download threads run could copy held locks
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        with ThreadPoolExecutor(max_workers=len(extractions) + 1) as threads, pool:
+            downloads = {}
+            for key in extractions:
+                downloads[threads.submit(self.ensure_download, key)] = key
+
+            jobs = {}
+            for future in as_completed(downloads):
+                key = downloads[future]
+                future.result()
+                if key == "system_coords_url":
+                    # stays in this process since it hands shards to the pool and rebuilds the indexes
+                    jobs[key] = threads.submit(self.extract_system_coords_parallel, files[key], pool, workers)
+                else:
+                    jobs[key] = pool.submit(run_extraction, extractions[key], files[key], self.writeCoordsJson)
+
+            for key in jobs:
+                jobs[key].result()
+
+        for key in extractions:
+            os.remove(files[key])
+        self.fileCache = {}
+        self.update_dataset_version(marketWatermark=jobs["stations_url"].result())
+
+    def ensure_download(self, key):
+        url = self.urlDict[key]
+        file = os.path.join(self.rawDatasetPath, self.file_from_url(url))
+        if not os.path.isfile(file):
+            self.download_file(url)
+        return file
+
     def update_populated_systems(self):
         url = self.urlDict["populated_system_url"]
         file = os.path.join(self.rawDatasetPath, self.file_from_url(url))
@@ -31,6 +94,7 @@ class OfflineDatabase_EDSM(od.OfflineDatabase):
 
         # after done, then delete the downloaded raw file
         os.remove(file)
+        self.update_dataset_version()
 
     def update_system_coords(self):
         url = self.urlDict["system_coords_url"]
@@ -45,6 +109,7 @@ class OfflineDatabase_EDSM(od.OfflineDatabase):
 
         # after done, then delete the downloaded raw file
         os.remove(file)
+        self.update_dataset_version()
 
     def update_stations(self):
         url = self.urlDict["stations_url"]
@@ -55,22 +120,49 @@ class OfflineDatabase_EDSM(od.OfflineDatabase):
             self.download_file(url)
         
         # if downloaded, then extract it
-        self.extract_stations(file)
+        marketWatermark = self.extract_stations(file)
 
         # after done, then delete the downloaded raw file
         os.remove(file)
+        self.update_dataset_version(marketWatermark=marketWatermark)
 
-    def extract_populated_systems(self, file):
-        unzip_file = os.path.splitext(file)[0]
+    # patches the existing dataset instead of rebuilding it:
+    # systems from the 7 days dump are appended, and only stations whose market changed
+    # since the stored watermark get new market records (see compact_market_deltas)
+    def update_incremental(self):
+        if self.coordsStore is None or self.get_market_index() is None:
+            print("ERROR: Incremental update needs a full dataset first, run update_all.")
+            return
+
+        file = self.ensure_download("system_coords_7days_url")
+        self.patch_system_coords(file)
+        os.remove(file)
+
+        # EDSM has no recent-stations dump, so the full one is streamed but only changed markets are written
+        file = self.ensure_download("stations_url")
+        marketWatermark = self.patch_stations(file, self.get_dataset_version().get("marketWatermark") or "")
+        os.remove(file)
+
+        self.update_dataset_version(marketWatermark=marketWatermark)
 
-        # unzip gz file first
-        with gzip.open(file, 'rb') as f_in:
-            with open(unzip_file, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+    def update_dataset_version(self, **changes):
+        versionInfo = dict(self.get_dataset_version())
+        versionInfo.update(changes)
+        versionInfo["version"] = versionInfo.get("version", 0) + 1
+        versionInfo["updated"] = time.time()
+        with open(self.dataset_version_file + ".tmp", 'w', encoding ='utf8') as json_file:
+            json.dump(versionInfo, json_file)
+        os.replace(self.dataset_version_file + ".tmp", self.dataset_version_file)
+        self.invalidate_cache(self.dataset_version_file)
 
-        dataList = []
-        with open(unzip_file, 'rb') as input_file:
-            for record in ijson.items(input_file, "item"):
+    def extract_populated_systems(self, file):
+        # both files are written while the dump streams in, nothing is kept in memory
+        populatedWriter = JsonStreamWriter(self.populated_system_file)
+        stationsWriter = JsonStreamWriter(self.system_stations_file, isObject=True)   # system name -> station list index
+        progress = jb.RateLogger("populated systems")
+        with gzip.open(file, 'rb') as input_file:
+            for record in jb.items(input_file):
+                progress.tick()
                 newData = {
                     "id" : record['id'],
                     "name" : record['name'],
@@ -83,93 +175,396 @@ class OfflineDatabase_EDSM(od.OfflineDatabase):
                             "id" : station['id'],
                             "marketId" : station['marketId'],
                             "type" : station['type'],
-                            "name" : station['name']
+                            "name" : station['name'],
+                            "distanceToArrival" : station.get('distanceToArrival')
                         }
                         stationList.append(newStationData)
                 
                 if (stationList):
                     newData['stations'] = stationList
-                    dataList.append(newData)
-            
-        with open(self.populated_system_file, 'w', encoding ='utf8') as json_file: 
-            json.dump(dataList, json_file) 
+                    populatedWriter.write(newData)
+                    stationsWriter.write(stationList, key=newData['name'])
 
-    def extract_system_coords(self, file):
-        unzip_file = os.path.splitext(file)[0]
-
-        # unzip gz file first
-        with gzip.open(file, 'rb') as f_in:
-            with open(unzip_file, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-
-        with open(unzip_file, 'rb') as input_file:
-            dataList = []
-            maxCount = 1048576
-            id = 0
-            for record in ijson.items(input_file, "item"):
-                newData = {
-                    "id" : record['id'],
-                    "name" : record['name']
-                }
+        progress.close()
+        populatedWriter.close()
+        stationsWriter.close()
+        self.invalidate_cache(self.populated_system_file)
+        self.invalidate_cache(self.system_stations_file)
 
-                origCoords = record['coords']
-                coords = {}
-                for elem in origCoords:
-                    coords[elem] = float(origCoords[elem])
-                newData["coords"] = coords
+    def extract_system_coords(self, file):
+        maxCount = 1048576
+        id = 0
+        chunkWriter = None
+        # drop the mapped store and index before their files get rewritten
+        self.coordsStore = None
+        self.spatialIndex = None
+        self.nameIndex = None
+        storeWriter = cs.CoordsStoreWriter(self.system_coords_store_path)
+        progress = jb.RateLogger("system coords")
+        with gzip.open(file, 'rb') as input_file:
+            for record in jb.items(input_file):
+                progress.tick()
+                newData = parse_system_record(record)
+                coords = newData["coords"]
+                storeWriter.add(newData['id'], newData['name'], coords['x'], coords['y'], coords['z'])
+                if not self.writeCoordsJson:
+                    continue
 
-                dataList.append(newData)
-                
-                if len(dataList) >= maxCount:
-                    self.save_system_coords(dataList, id)
-                    dataList = []
+                if chunkWriter is None:
+                    chunkWriter = self.open_system_coords(id)
+                chunkWriter.write(newData)
+                if chunkWriter.count >= maxCount:
+                    chunkWriter.close()
+                    chunkWriter = None
                     id += 1
 
-            if dataList:
-                self.save_system_coords(dataList, id)
+        if chunkWriter is not None:
+            chunkWriter.close()
+        storeWriter.close()
+        progress.close()
+
+        self.coordsStore = cs.load_coords_store(self.system_coords_store_path)
+        self.build_spatial_index()
+        self.build_name_index()
+
+    # same result as extract_system_coords, with the parsing spread over the process pool
+    # relies on the dump having one record per line, which EDSM's dumps do, otherwise falls back to serial
+    def extract_system_coords_parallel(self, file, pool, workers):
+        shardRoot = self.system_coords_store_path + "_shards"
+        if os.path.isdir(shardRoot):
+            shutil.rmtree(shardRoot)
+        self.coordsStore = None
+        self.spatialIndex = None
+        self.nameIndex = None
+
+        if not is_line_per_record(file):
+            print("LOG: {} isn't one record per line, extracting serially.".format(file))
+            self.extract_system_coords(file)
+            return
+
+        shardPaths = []
+        pending = deque()
+        progress = jb.RateLogger("system coords, {} workers".format(workers))
+        try:
+            for id, lines in enumerate(iter_line_batches(file, shard_count)):
+                shardPath = os.path.join(shardRoot, "shard_{}".format(id))
+                chunkFile = None
+                if self.writeCoordsJson:
+                    self.ensure_directory(self.system_coords_path)
+                    chunkFile = os.path.join(self.system_coords_path, "system_coords_{}.json".format(id))
+                pending.append(pool.submit(parse_system_shard, lines, shardPath, chunkFile))
+                shardPaths.append(shardPath)
+
+                # only a few shards in flight, so the dump never sits in memory
+                while len(pending) > workers:
+                    progress.tick(pending.popleft().result())
+            while pending:
+                progress.tick(pending.popleft().result())
+        except ValueError as e:
+            print("LOG: Can't split {} by lines ({}), extracting serially.".format(file, e))
+            shutil.rmtree(shardRoot, ignore_errors=True)
+            self.extract_system_coords(file)
+            return
+
+        progress.close()
+        print("LOG: Merging {} system coords shards...".format(len(shardPaths)))
+        cs.merge_coords_stores(shardPaths, self.system_coords_store_path)
+        shutil.rmtree(shardRoot, ignore_errors=True)
+
+        self.coordsStore = cs.load_coords_store(self.system_coords_store_path)
+        self.build_spatial_index()
+        self.build_name_index()
+
+    # converts already extracted system_coords_*.json chunks into the binary store
+    def convert_system_coords(self):
+        self.coordsStore = None
+        self.spatialIndex = None
+        storeWriter = cs.CoordsStoreWriter(self.system_coords_store_path)
+        for df in od.SystemCoordsIterator():
+            for id, name, coords in zip(df["id"], df["name"], df["coords"]):
+                storeWriter.add(int(id), name, coords['x'], coords['y'], coords['z'])
+        storeWriter.close()
+        self.coordsStore = cs.load_coords_store(self.system_coords_store_path)
+
+    def build_spatial_index(self):
+        if self.coordsStore is None:
+            print("LOG: Converting system coords files to binary store...")
+            self.convert_system_coords()
+        print("LOG: Building system spatial index...")
+        si.build_spatial_index(self.coordsStore, self.system_index_path)
+        self.spatialIndex = self.load_spatial_index()
+
+    def build_name_index(self):
+        if self.coordsStore is None:
+            print("LOG: Converting system coords files to binary store...")
+            self.convert_system_coords()
+        print("LOG: Building system name index...")
+        ni.build_name_index(self.coordsStore.nameHashes, self.system_name_index_path)
+        self.nameIndex = self.load_name_index()
 
+    # returns the latest market update time seen, the watermark for update_incremental
     def extract_stations(self, file):
-        unzip_file = os.path.splitext(file)[0]
-
-        # unzip gz file first
-        with gzip.open(file, 'rb') as f_in:
-            with open(unzip_file, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-
-        with open(unzip_file, 'rb') as input_file:
-            dataList = []
-            maxCount = 4096
-            id = 0
-            for record in ijson.items(input_file, "item"):
+        maxCount = 4096
+        id = 0
+        chunkWriter = None
+        marketIndex = {}   # station id -> [market file, byte offset, byte length]
+        marketWatermark = ""
+        priceWriter = pm.PriceMatrixWriter(self.station_prices_path)
+        self.remove_market_deltas()
+        progress = jb.RateLogger("stations")
+        with gzip.open(file, 'rb') as input_file:
+            for record in jb.items(input_file):
+                progress.tick()
                 # skip record if no market
                 if not record['haveMarket']:
                     continue
 
-                newData = {
-                    "id" : record['id'],
-                    "name" : record['name'],
-                    "type" : record['type'],
-                    "haveShipyard" : record['haveShipyard'],
-                    "commodities" : record['commodities']
-                }
-                dataList.append(newData)
+                newData = parse_station_record(record)
+                marketWatermark = max(marketWatermark, market_update_time(record))
+                priceWriter.add(newData['id'], newData['commodities'])
 
-                if len(dataList) >= maxCount:
-                    self.save_station_market(dataList, id)
-                    dataList = []
+                if chunkWriter is None:
+                    chunkWriter = self.open_station_market(id)
+                offset, length = chunkWriter.write(newData)
+                marketIndex[newData['id']] = [chunkWriter.fName, offset, length]
+                if chunkWriter.count >= maxCount:
+                    chunkWriter.close()
+                    chunkWriter = None
                     id += 1
-                
-            if dataList:
-                self.save_station_market(dataList, id)
 
-    def save_system_coords(self, list, id):
+        if chunkWriter is not None:
+            chunkWriter.close()
+        progress.close()
+        print("LOG: Building station price matrix...")
+        priceWriter.close()
+
+        with open(self.station_market_index_file, 'w', encoding ='utf8') as json_file:
+            json.dump(marketIndex, json_file)
+        self.invalidate_cache(self.station_market_index_file)
+        return marketWatermark
+
+    # appends systems that aren't in the store yet, then rebuilds the system indexes
+    def patch_system_coords(self, file):
+        added = set()
+        storeWriter = None
+        with gzip.open(file, 'rb') as input_file:
+            for record in jb.items(input_file):
+                newData = parse_system_record(record)
+                name = newData['name']
+                if name in added or self.find_system_rows(name):
+                    continue
+                if storeWriter is None:
+                    storeWriter = cs.CoordsStoreWriter(self.system_coords_store_path, append=True)
+                coords = newData["coords"]
+                storeWriter.add(newData['id'], name, coords['x'], coords['y'], coords['z'])
+                added.add(name)
+
+        print("LOG: {} new systems.".format(len(added)))
+        if storeWriter is None:
+            return
+        storeWriter.close()
+        self.coordsStore = cs.load_coords_store(self.system_coords_store_path)
+        self.build_spatial_index()
+        self.build_name_index()
+
+    def find_system_rows(self, systemName):
+        if self.nameIndex is not None:
+            return [row for row in self.nameIndex.lookup(systemName) if self.coordsStore.get_name(row) == systemName]
+        return self.coordsStore.find_rows(systemName)
+
+    # writes markets updated after watermark into a new delta file and points the index at them,
+    # returns the new watermark
+    def patch_stations(self, file, watermark):
+        marketIndex = dict(self.get_market_index() or {})
+        systemStations = dict(self.get_system_stations() or {})
+        version = self.get_dataset_version()["version"] + 1
+        deltaName = "station_market_delta_{}.json".format(version)
+        deltaWriter = None
+        priceWriter = pm.PriceMatrixWriter(self.station_prices_path, base=self.get_price_matrix())
+        newWatermark = watermark
+        with gzip.open(file, 'rb') as input_file:
+            for record in jb.items(input_file):
+                if not record['haveMarket']:
+                    continue
+                marketTime = market_update_time(record)
+                if marketTime <= watermark and str(record['id']) in marketIndex:
+                    continue
+
+                if deltaWriter is None:
+                    self.ensure_directory(self.station_market_path)
+                    deltaWriter = JsonStreamWriter(os.path.join(self.station_market_path, deltaName))
+                newData = parse_station_record(record)
+                offset, length = deltaWriter.write(newData)
+                priceWriter.add(newData['id'], newData['commodities'])
+                marketIndex[str(record['id'])] = [deltaName, offset, length]
+                newWatermark = max(newWatermark, marketTime)
+
+                # new market stations also need to show up under their system
+                systemName = record.get('systemName')
+                if systemName:
+                    stationList = systemStations.setdefault(systemName, [])
+                    if not any(station['id'] == record['id'] for station in stationList):
+                        stationList.append({
+                            "id" : record['id'],
+                            "marketId" : record['marketId'],
+                            "type" : record['type'],
+                            "name" : record['name'],
+                            "distanceToArrival" : record.get('distanceToArrival')
+                        })
+
+        if deltaWriter is None:
+            print("LOG: No market changed since {}.".format(watermark))
+            return newWatermark
+        deltaWriter.close()
+        priceWriter.close()
+        print("LOG: {} markets updated.".format(deltaWriter.count))
+        obsolete = self.compact_market_deltas(marketIndex, version)
+
+        for target, data in [(self.station_market_index_file, marketIndex), (self.system_stations_file, systemStations)]:
+            with open(target + ".tmp", 'w', encoding ='utf8') as json_file:
+                json.dump(data, json_file)
+            os.replace(target + ".tmp", target)
+            self.invalidate_cache(target)
+        # only once the index points at the merged file
+        for fName in obsolete:
+            os.remove(os.path.join(self.station_market_path, fName))
+        return newWatermark
+
+    # past max_market_deltas files or max_superseded_delta_bytes of replaced records, the records marketIndex
+    # still points at in delta files are written into one and the index is moved over,
+    # returns the delta files to remove after the index is saved (none if nothing was merged)
+    # base files keep their replaced records until the next update_all rewrites them
+    def compact_market_deltas(self, marketIndex, version):
+        deltas = [fName for fName in os.listdir(self.station_market_path) if fName.startswith("station_market_delta_")]
+        live = [(id, entry) for id, entry in marketIndex.items() if entry[0] in deltas]
+        superseded = sum(os.path.getsize(os.path.join(self.station_market_path, fName)) for fName in deltas) - sum(entry[2] for id, entry in live)
+        if len(deltas) <= max_market_deltas and superseded <= max_superseded_delta_bytes:
+            return []
+
+        print("LOG: Merging {} market delta files...".format(len(deltas)))
+        compactWriter = JsonStreamWriter(os.path.join(self.station_market_path, "station_market_delta_compact_{}.json".format(version)))
+        for (id, entry), record in zip(live, self.read_market_records([entry for id, entry in live])):
+            offset, length = compactWriter.write(record)
+            marketIndex[id] = [compactWriter.fName, offset, length]
+        compactWriter.close()
+        return deltas
+
+    def remove_market_deltas(self):
+        if not os.path.isdir(self.station_market_path):
+            return
+        for fName in os.listdir(self.station_market_path):
+            if fName.startswith("station_market_delta_"):
+                os.remove(os.path.join(self.station_market_path, fName))
+
+    def open_system_coords(self, id):
         self.ensure_directory(self.system_coords_path)
-        file = os.path.join(self.system_coords_path, "system_coords_{}.json".format(id))
-        with open(file, 'w', encoding ='utf8') as json_file: 
-            json.dump(list, json_file)
+        return JsonStreamWriter(os.path.join(self.system_coords_path, "system_coords_{}.json".format(id)))
 
-    def save_station_market(self, list, id):
+    def open_station_market(self, id):
         self.ensure_directory(self.station_market_path)
-        file = os.path.join(self.station_market_path, "station_market_{}.json".format(id))
-        with open(file, 'w', encoding ='utf8') as json_file: 
-            json.dump(list, json_file)
\ No newline at end of file
+        return JsonStreamWriter(os.path.join(self.station_market_path, "station_market_{}.json".format(id)))
+
+def parse_station_record(record):
+    return {
+        "id" : record['id'],
+        "name" : record['name'],
+        "type" : record['type'],
+        "haveShipyard" : record['haveShipyard'],
+        "commodities" : record['commodities']
+    }
+
+# "YYYY-MM-DD hh:mm:ss" of the market's last update, compares correctly as a string
+def market_update_time(record):
+    updateTime = record.get('updateTime') or {}
+    return updateTime.get('market') or ""
+
+def parse_system_record(record):
+    newData = {
+        "id" : record['id'],
+        "name" : record['name']
+    }
+
+    origCoords = record['coords']
+    coords = {}
+    for elem in origCoords:
+        coords[elem] = float(origCoords[elem])
+    newData["coords"] = coords
+    return newData
+
+# checks that the dump looks like EDSM's layout: "[" then one json object per line
+def is_line_per_record(file):
+    with gzip.open(file, 'rb') as input_file:
+        first = input_file.readline(1024).strip()
+        second = input_file.readline(1 << 20).strip().rstrip(b",")
+    if first != b"[":
+        return False
+    try:
+        return isinstance(jb.loads(second), dict)
+    except ValueError:
+        return False
+
+# yields the gzip dump's lines in batches of count lines, joined as bytes
+def iter_line_batches(file, count):
+    lines = []
+    with gzip.open(file, 'rb') as input_file:
+        for line in input_file:
+            lines.append(line)
+            if len(lines) >= count:
+                yield b"".join(lines)
+                lines = []
+    if lines:
+        yield b"".join(lines)
+
+# process pool job: parses one batch of dump lines into a store shard (and a json chunk if chunkFile)
+def parse_system_shard(lines, shardPath, chunkFile=None):
+    storeWriter = cs.CoordsStoreWriter(shardPath)
+    chunkWriter = JsonStreamWriter(chunkFile) if chunkFile else None
+    for line in lines.splitlines():
+        line = line.strip().rstrip(b",")
+        if not line or line == b"[" or line == b"]":
+            continue
+        record = jb.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("line is not a single record")
+        newData = parse_system_record(record)
+        coords = newData["coords"]
+        storeWriter.add(newData['id'], newData['name'], coords['x'], coords['y'], coords['z'])
+        if chunkWriter:
+            chunkWriter.write(newData)
+    storeWriter.close()
+    if chunkWriter:
+        chunkWriter.close()
+    return storeWriter.count
+
+# process pool job: runs one extract_* method in a fresh database object
+def run_extraction(methodName, file, writeCoordsJson=False):
+    database = OfflineDatabase_EDSM(writeCoordsJson)
+    return getattr(database, methodName)(file)
+
+# writes a json array (or object) one entry at a time into a temporary file,
+# which replaces the target on close so readers never see a half written file
+class JsonStreamWriter:
+    def __init__(self, file, isObject=False):
+        self.file = file
+        self.fName = os.path.basename(file)
+        self.isObject = isObject
+        self.count = 0
+        self.output = open(file + ".tmp", 'wb')
+        self.output.write(b"{" if isObject else b"[")
+
+    # returns (byte offset, byte length) of the written value
+    def write(self, data, key=None):
+        if self.count:
+            self.output.write(b", ")
+        if self.isObject:
+            self.output.write(jb.dumps(key) + b": ")
+        encoded = jb.dumps(data)
+        offset = self.output.tell()
+        self.output.write(encoded)
+        self.count += 1
+        return offset, len(encoded)
+
+    def close(self):
+        self.output.write(b"}" if self.isObject else b"]")
+        self.output.close()
+        os.replace(self.file + ".tmp", self.file)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import classes
+from . import cost_model as cm
+
+# resident planner: datasets are loaded once, then plan requests are answered over a local json api
+#   GET  /health  -> {"status": "ok", "datasetVersion": n, "stations": cached stations}
+#   POST /plan    -> {"routes": [...], "seconds": time spent}, body is a json object of plan options
+default_host = "127.0.0.1"
+default_port = 8765
+max_body_bytes = 1024 * 1024
+
+# plan options taken from the request body, name -> type it's converted to
+plan_options = {
+    "minHop" : int,
+    "deviation" : float,
+    "cargoSpace" : int,
+    "minRange" : float,
+    "lazy" : bool,
+    "engine" : str,
+    "corridorWidth" : float,
+    "capital" : int,
+    "maxStops" : int,
+    "stopSeconds" : float,
+}
+cost_model_options = ["jumpSeconds", "dockSeconds", "supercruiseBase", "supercruisePerSqrtLs", "unknownArrivalLs"]
+
+class RequestError(Exception):
+    pass
+
+# a location in the request that the backend doesn't know
+class NotFoundError(Exception):
+    pass
+
+# numpy numbers end up in route items, json only knows the python ones
+def json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError("{} is not json serializable".format(type(value).__name__))
+
+def parse_plan_request(body):
+    if not isinstance(body, dict):
+        raise RequestError("Request body must be a json object")
+    for key in ["from", "to", "jumpRange"]:
+        if key not in body:
+            raise RequestError("Missing '{}'".format(key))
+
+    kwargs = {}
+    try:
+        jumpRange = float(body["jumpRange"])
+        for key, kind in plan_options.items():
+            if body.get(key) is not None:
+                kwargs[key] = kind(body[key])
+        costModel = body.get("costModel")
+        if costModel is not None:
+            unknown = set(costModel) - set(cost_model_options)
+            if unknown:
+                raise RequestError("Unknown costModel options: {}".format(", ".join(sorted(unknown))))
+            kwargs["costModel"] = cm.CostModel(**{key: float(value) for key, value in costModel.items()})
+    except (TypeError, ValueError, AttributeError) as e:
+        raise RequestError("Invalid option: {}".format(e))
+    if jumpRange <= 0:
+        raise RequestError("jumpRange must be positive")
+    if kwargs.get("engine", "bfs") not in classes.route_engines:
+        raise RequestError("Unknown engine '{}', use one of {}".format(kwargs["engine"], ", ".join(classes.route_engines)))
+    return str(body["from"]), str(body["to"]), jumpRange, kwargs
+
+# the planner assumes both ends exist, so they're looked up before it runs
+def check_location(planner, location):
+    systemName, stationName = planner.location_parse(location)
+    if not systemName:
+        raise RequestError("Empty location")
+    if not classes.get_system_coord(systemName, classes.RuntimeDatabase()):
+        raise NotFoundError("Unknown system '{}'".format(systemName))
+    if stationName and stationName not in (classes.get_stations(systemName, noPlanet=False) or []):
+        raise NotFoundError("Unknown station '{}' in {}".format(stationName, systemName))
+
+# plans are independent, every request gets its own TripPlanner and RuntimeDatabase
+# while stations and the offline tables are shared through the process wide caches
+def run_plan(body):
+    fromLocation, toLocation, jumpRange, kwargs = parse_plan_request(body)
+    start = time.time()
+    planner = classes.TripPlanner()
+    check_location(planner, fromLocation)
+    check_location(planner, toLocation)
+    planner.plan(fromLocation, toLocation, jumpRange, **kwargs)
+    if not planner.routes:
+        raise NotFoundError("No route found from {} to {}".format(fromLocation, toLocation))
+    return {
+        "routes" : [route.to_dict() for route in planner.routes],
+        "seconds" : time.time() - start,
+    }
+
+class PlannerHandler(BaseHTTPRequestHandler):
+    server_version = "PlannerService/1.0"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {
+                "status" : "ok",
+                "datasetVersion" : classes.get_dataset_version(),
+                "stations" : len(classes.station_registry),
+            })
+        else:
+            self.send_json(404, {"error": "Unknown path {}".format(self.path)})
+
+    def do_POST(self):
+        if self.path != "/plan":
+            self.send_json(404, {"error": "Unknown path {}".format(self.path)})
+            return
+        try:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                raise RequestError("Invalid Content-Length")
+            if length < 0:
+                raise RequestError("Invalid Content-Length")
+            if length > max_body_bytes:
+                raise RequestError("Request body too large")
+            body = json.loads(self.rfile.read(length) or b"{}")
+            self.send_json(200, run_plan(body))
+        except (RequestError, json.JSONDecodeError) as e:
+            self.send_json(400, {"error": str(e)})
+        except NotFoundError as e:
+            self.send_json(404, {"error": str(e)})
+        except Exception as e:
+            print("ERROR: Plan failed: {!r}".format(e))
+            self.send_json(500, {"error": "Plan failed: {!r}".format(e)})
+
+    def send_json(self, status, data):
+        payload = json.dumps(data, default=json_default).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # unix socket peers have no address
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+# windows has no unix sockets, there the service is host/port only
+if hasattr(socket, "AF_UNIX"):
+    class UnixPlannerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        # BaseHTTPRequestHandler expects a host/port pair here
+        def get_request(self):
+            request, _ = super().get_request()
+            return request, ("unix", 0)
+
+# builds the server without serving yet, socketPath picks a unix socket over host/port
+# port 0 lets the os choose a free one, read it back from server.server_address
+def create_server(host=default_host, port=default_port, socketPath=None):
+    if socketPath:
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        return UnixPlannerServer(socketPath, PlannerHandler)
+    return ThreadingHTTPServer((host, port), PlannerHandler)
+
+def serve(host=default_host, port=default_port, socketPath=None):
+    print("LOG: Loading datasets...")
+    start = time.time()
+    classes.warm_up()
+    print("LOG: Datasets loaded in {:.1f}s.".format(time.time() - start))
+
+    server = create_server(host, port, socketPath)
+    print("LOG: Planner service listening on {}.".format(socketPath or "http://{}:{}".format(*server.server_address[:2])))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socketPath and os.path.exists(socketPath):
+            os.remove(socketPath)
+
+# runs serve on a background thread, for notebooks and localhost tests, returns the server to shut down later
+def serve_in_background(host=default_host, port=0, socketPath=None):
+    classes.warm_up()
+    server = create_server(host, port, socketPath)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident trade planner answering plan requests over a local json api.")
+    parser.add_argument("--host", default=default_host)
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--socket", dest="socketPath", help="serve on this unix socket instead of host/port")
+    args = parser.parse_args(argv)
+    if args.socketPath and not hasattr(socket, "AF_UNIX"):
+        parser.error("unix sockets aren't supported on this platform")
+    serve(args.host, args.port, args.socketPath)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import json
+from array import array
+import numpy as np
+
+# dense (stations x commodities) int32 market tables, one .npy file per field
+# rows follow stationIds (sorted), columns follow the commodities list
+price_fields = ["buyPrice", "sellPrice", "stock", "demand"]
+
+# memory mapped view, a station's market is one row slice of every field
+class PriceMatrix:
+    def __init__(self, stationIds, fields, commodities):
+        self.stationIds = stationIds
+        self.fields = fields
+        self.commodityIds = [commodity["id"] for commodity in commodities]
+        self.commodityNames = [commodity["name"] for commodity in commodities]
+        self.columns = {commodityId: column for column, commodityId in enumerate(self.commodityIds)}
+
+    def __len__(self):
+        return len(self.stationIds)
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def row_of(self, stationId):
+        row = int(np.searchsorted(self.stationIds, stationId))
+        if row < len(self.stationIds) and self.stationIds[row] == stationId:
+            return row
+        return None
+
+    # rows for many station ids at once, -1 where the station has no market
+    def rows_of(self, stationIds):
+        stationIds = np.asarray(stationIds, dtype=np.int64)
+        if not len(self.stationIds):
+            return np.full(len(stationIds), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.stationIds, stationIds), len(self.stationIds) - 1)
+        return np.where(self.stationIds[rows] == stationIds, rows, -1)
+
+    # (len(rows) x commodities) arrays of every field for the given rows
+    def slice(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        return {field: np.asarray(self.fields[field][rows]) for field in price_fields}
+
+    # (columns, values) of the listed commodities of every row, sliced out in one go
+    # values is (len(price_fields) x listed) int64, the shape trade.sparse_market gives
+    def sparse_rows(self, rows):
+        values = self.slice(rows)
+        stacked = np.stack([values[field] for field in price_fields]).astype(np.int64)
+        listed = (stacked != 0).any(axis=0)
+        result = []
+        for id in range(len(rows)):
+            columns = np.flatnonzero(listed[id])
+            result.append((columns, stacked[:, id, columns]))
+        return result
+
+    # the commodity list of one station, in the same shape as the market records
+    def market_data(self, row):
+        return self.market_data_many([row])[0]
+
+    def market_data_many(self, rows):
+        result = []
+        for columns, values in self.sparse_rows(rows):
+            markets = []
+            for id, column in enumerate(columns.tolist()):
+                market = {"id": self.commodityIds[column], "name": self.commodityNames[column]}
+                for field, fieldValues in zip(price_fields, values):
+                    market[field] = int(fieldValues[id])
+                markets.append(market)
+            result.append(markets)
+        return result
+
+# collects station markets as they stream by and writes the dense tables on close
+# with base, stations not added again keep their rows from it
+class PriceMatrixWriter:
+    def __init__(self, path, base=None):
+        self.path = path
+        self.base = base
+        self.commodities = []
+        self.columns = {}
+        if base is not None:
+            for commodityId, name in zip(base.commodityIds, base.commodityNames):
+                self.add_commodity(commodityId, name)
+
+        # sparse entries, (station, column, values) per listed commodity
+        self.stationIds = array("q")
+        self.entryStations = array("q")
+        self.entryColumns = array("q")
+        self.entryValues = {field: array("l") for field in price_fields}
+
+    def add_commodity(self, commodityId, name):
+        if commodityId not in self.columns:
+            self.columns[commodityId] = len(self.commodities)
+            self.commodities.append({"id": commodityId, "name": name})
+        return self.columns[commodityId]
+
+    def add(self, stationId, commodities):
+        station = len(self.stationIds)
+        self.stationIds.append(stationId)
+        for market in commodities or []:
+            self.entryStations.append(station)
+            self.entryColumns.append(self.add_commodity(market["id"], market["name"]))
+            for field in price_fields:
+                self.entryValues[field].append(int(market.get(field) or 0))
+
+    def close(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        metaFile = os.path.join(self.path, "meta.json")
+        if os.path.isfile(metaFile):
+            os.remove(metaFile)
+
+        newIds = np.frombuffer(self.stationIds, dtype=np.int64) if len(self.stationIds) else np.zeros(0, dtype=np.int64)
+        keptIds = np.zeros(0, dtype=np.int64)
+        keptRows = np.zeros(0, dtype=np.int64)
+        if self.base is not None and len(self.base):
+            keep = ~np.isin(self.base.stationIds, newIds)
+            keptRows = np.flatnonzero(keep)
+            keptIds = np.asarray(self.base.stationIds)[keptRows]
+
+        # later adds of the same station win
+        uniqueIds, lastIndex = np.unique(newIds[::-1], return_index=True)
+        lastStation = len(newIds) - 1 - lastIndex
+        stationIds = np.concatenate([keptIds, uniqueIds])
+        order = np.argsort(stationIds, kind="stable")
+        # rowOf[i] is the final row of the i-th source row (kept ones first, then the new ones)
+        rowOf = np.empty(len(stationIds), dtype=np.int64)
+        rowOf[order] = np.arange(len(stationIds))
+        newRowOf = np.full(len(newIds), -1, dtype=np.int64)
+        newRowOf[lastStation] = rowOf[len(keptIds):]
+
+        shape = (len(stationIds), len(self.commodities))
+        entryStations = np.frombuffer(self.entryStations, dtype=np.int64) if len(self.entryStations) else np.zeros(0, dtype=np.int64)
+        entryColumns = np.frombuffer(self.entryColumns, dtype=np.int64) if len(self.entryColumns) else np.zeros(0, dtype=np.int64)
+        entryRows = newRowOf[entryStations]
+        valid = entryRows >= 0
+        # written next to the old tables and swapped in at the end, base may still be mapped from them
+        for field in price_fields:
+            table = np.lib.format.open_memmap(os.path.join(self.path, field + ".npy.tmp"), mode="w+", dtype=np.int32, shape=shape)
+            if len(keptRows):
+                baseTable = self.base[field]
+                table[rowOf[:len(keptIds)], :baseTable.shape[1]] = baseTable[keptRows]
+            values = np.asarray(self.entryValues[field], dtype=np.int64)
+            table[entryRows[valid], entryColumns[valid]] = values[valid]
+            table.flush()
+            del table
+
+        for field in price_fields:
+            os.replace(os.path.join(self.path, field + ".npy.tmp"), os.path.join(self.path, field + ".npy"))
+        with open(os.path.join(self.path, "station_ids.npy.tmp"), 'wb') as f:
+            np.save(f, stationIds[order])
+        os.replace(os.path.join(self.path, "station_ids.npy.tmp"), os.path.join(self.path, "station_ids.npy"))
+        with open(os.path.join(self.path, "commodities.json"), 'w', encoding ='utf8') as json_file:
+            json.dump(self.commodities, json_file)
+        with open(metaFile, 'w', encoding ='utf8') as json_file:
+            json.dump({"count": len(stationIds), "commodities": len(self.commodities)}, json_file)
+
+def has_price_matrix(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+def load_price_matrix(path):
+    if not has_price_matrix(path):
+        return None
+
+    with open(os.path.join(path, "meta.json"), 'r', encoding ='utf8') as json_file:
+        meta = json.load(json_file)
+    with open(os.path.join(path, "commodities.json"), 'r', encoding ='utf8') as json_file:
+        commodities = json.load(json_file)
+    # empty arrays can't be memory mapped
+    mmapMode = "r" if meta["count"] and meta["commodities"] else None
+    stationIds = np.load(os.path.join(path, "station_ids.npy"), mmap_mode="r" if meta["count"] else None)
+    fields = {}
+    for field in price_fields:
+        fields[field] = np.load(os.path.join(path, field + ".npy"), mmap_mode=mmapMode)
+    return PriceMatrix(stationIds, fields, commodities)
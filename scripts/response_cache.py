@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+day = 24 * 60 * 60
+forever = None
+
+# (path, query flag) -> (fresh seconds, stale seconds)
+# within fresh the cached response is used as is, within stale it's used while a refresh runs behind it
+endpoint_ttls = [
+    (("/api-v1/system", "showCoordinates"), (forever, forever)),
+    (("/api-v1/system", "showInformation"), (7 * day, 30 * day)),
+    (("/api-v1/sphere-systems", None), (30 * day, forever)),
+    (("/api-system-v1/stations/market", None), (60 * 60, day)),
+    (("/api-system-v1/stations", None), (3 * day, 30 * day)),
+]
+default_ttl = (60 * 60, day)
+
+# cache key without scheme/host and with sorted query, so equal requests share an entry
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return "{}?{}".format(parts.path, urlencode(query))
+
+def ttl_for(url):
+    parts = urlsplit(url)
+    queryKeys = [key for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+    for (path, flag), ttl in endpoint_ttls:
+        if parts.path == path and (flag is None or flag in queryKeys):
+            return ttl
+    return default_ttl
+
+# sqlite backed response cache keyed by normalized url
+class ResponseCache:
+    # cache states returned by lookup
+    MISS = 0
+    FRESH = 1
+    STALE = 2
+
+    def __init__(self, file):
+        self.file = file
+        directory = os.path.dirname(file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file, check_same_thread=False)
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, body TEXT, fetched REAL)")
+            self.connection.commit()
+
+    # returns (state, response)
+    def lookup(self, url):
+        with self.lock:
+            row = self.connection.execute("SELECT body, fetched FROM responses WHERE url = ?", (normalize_url(url),)).fetchone()
+        if not row:
+            return self.MISS, None
+
+        body, fetched = row
+        fresh, stale = ttl_for(url)
+        age = time.time() - fetched
+        if fresh is forever or age <= fresh:
+            return self.FRESH, json.loads(body)
+        if stale is forever or age <= stale:
+            return self.STALE, json.loads(body)
+        return self.MISS, None
+
+    def store(self, url, response):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses (url, body, fetched) VALUES (?, ?, ?)",
+                                    (normalize_url(url), json.dumps(response), time.time()))
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
@@ -0,0 +1,275 @@
+import os
+import json
+import math
+import numpy as np
+
+default_cell_size = 50.0
+# above this many (x, y) cell columns a query just scans every point instead
+max_query_columns = 65536
+scan_batch_size = 4194304
+
+# expands [start, start+length) ranges into one flat index array
+def ranges_to_indices(starts, lengths):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if total <= 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)[lengths > 0]
+    lengths = lengths[lengths > 0]
+    runOffsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - runOffsets, lengths) + np.arange(total, dtype=np.int64)
+
+# all pairs (i < j) with minDist < distance < maxDist
+# points are bucketed into maxDist sized cells and only adjacent cells are compared
+def grid_pairs(xyz, maxDist, minDist=0):
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    if len(xyz) < 2 or maxDist <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # pad the grid by one cell on every side so neighbor keys never wrap around
+    cells = np.floor((xyz - xyz.min(axis=0)) / maxDist).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+
+    firstList = []
+    secondList = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                offset = (dx * dims[1] + dy) * dims[2] + dz
+                # each unordered cell pair once, the cell itself is handled with i < j below
+                if offset < 0:
+                    continue
+                starts = np.searchsorted(sortedKeys, sortedKeys + offset, side="left")
+                ends = np.searchsorted(sortedKeys, sortedKeys + offset, side="right")
+                if offset == 0:
+                    starts = np.maximum(starts, np.arange(len(sortedKeys)) + 1)
+                lengths = np.maximum(ends - starts, 0)
+                first = np.repeat(np.arange(len(sortedKeys)), lengths)
+                second = ranges_to_indices(starts, lengths)
+                distances = np.sqrt(((xyz[order[first]] - xyz[order[second]]) ** 2).sum(axis=1))
+                mask = (distances < maxDist) & (distances > minDist)
+                firstList.append(order[first[mask]])
+                secondList.append(order[second[mask]])
+
+    return np.concatenate(firstList), np.concatenate(secondList)
+
+# euclidean distance of every point (N x 3) to center, in float64
+def distances_from(points, center):
+    return np.sqrt(((np.asarray(points, dtype=np.float64) - center) ** 2).sum(axis=1))
+
+# distance of every point (N x 3) to the segment start -> end
+def segment_distances(points, start, end):
+    points = np.asarray(points, dtype=np.float64)
+    direction = end - start
+    lengthSq = float(np.dot(direction, direction))
+    if lengthSq == 0:
+        return distances_from(points, start)
+    t = np.clip((points - start) @ direction / lengthSq, 0, 1)
+    return np.sqrt(((points - start - t[:, None] * direction) ** 2).sum(axis=1))
+
+# inside the sphere of radius, and outside minRadius when given
+def radius_mask(distances, radius, minRadius=None):
+    mask = distances <= radius
+    if minRadius:
+        mask &= distances >= minRadius
+    return mask
+
+# lightweight result of a radius query, kept as arrays until dicts are needed
+class SystemBatch:
+    def __init__(self, names, xyz, distances):
+        self.names = names
+        self.xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        self.distances = np.asarray(distances, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def filter(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        names = [name for name, keep in zip(self.names, mask) if keep]
+        return SystemBatch(names, self.xyz[mask], self.distances[mask])
+
+    def to_list(self):
+        result = []
+        for name, (x, y, z), distance in zip(self.names, self.xyz.tolist(), self.distances.tolist()):
+            result.append({"name": name, "coords": {"x": x, "y": y, "z": z}, "distance": distance})
+        return result
+
+    @staticmethod
+    def concat(batches):
+        names = []
+        for batch in batches:
+            names.extend(batch.names)
+        if not batches:
+            return SystemBatch([], np.zeros((0, 3)), np.zeros(0))
+        return SystemBatch(names, np.concatenate([batch.xyz for batch in batches]),
+                           np.concatenate([batch.distances for batch in batches]))
+
+# uniform grid over packed float32 coordinates
+# points are sorted by cell key, so each (x, y) column of cells is one contiguous run
+# rows maps a sorted position back to its row in the coords store
+class SpatialIndex:
+    def __init__(self, xyz, keys, rows, meta, store):
+        self.xyz = xyz
+        self.keys = keys
+        self.rows = rows
+        self.store = store
+        self.cellSize = meta["cellSize"]
+        self.origin = np.array(meta["origin"], dtype=np.float64)
+        self.dims = np.array(meta["dims"], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # index positions of every point in the cells overlapping the cube around center,
+    # None if that cube spans too many columns to be worth it
+    def cell_candidates(self, center, radius):
+        lo = np.floor((center - radius - self.origin) / self.cellSize).astype(np.int64)
+        hi = np.floor((center + radius - self.origin) / self.cellSize).astype(np.int64)
+        if np.any(hi < 0) or np.any(lo >= self.dims):
+            return np.zeros(0, dtype=np.int64)
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, self.dims - 1)
+
+        columnCount = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1)
+        if columnCount > max_query_columns:
+            return None
+
+        ix, iy = np.meshgrid(np.arange(lo[0], hi[0] + 1), np.arange(lo[1], hi[1] + 1), indexing="ij")
+        columnBase = (ix.ravel() * self.dims[1] + iy.ravel()) * self.dims[2]
+        starts = np.searchsorted(self.keys, columnBase + lo[2], side="left")
+        ends = np.searchsorted(self.keys, columnBase + hi[2], side="right")
+        return ranges_to_indices(starts, ends - starts)
+
+    # returns (index positions, distances) of every point within radius of center
+    def query_radius(self, center, radius, minRadius=None):
+        center = np.asarray(center, dtype=np.float64)
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        candidates = self.cell_candidates(center, radius)
+        if candidates is None:
+            return self.scan_radius(center, radius, minRadius)
+
+        distances = distances_from(self.xyz[candidates], center)
+        mask = radius_mask(distances, radius, minRadius)
+        return candidates[mask], distances[mask]
+
+    # brute force pass over every point, used for very large radii
+    def scan_radius(self, center, radius, minRadius=None):
+        foundIndices = []
+        foundDistances = []
+        for begin in range(0, len(self), scan_batch_size):
+            end = min(begin + scan_batch_size, len(self))
+            distances = distances_from(self.xyz[begin:end], center)
+            mask = radius_mask(distances, radius, minRadius)
+            foundIndices.append(np.flatnonzero(mask) + begin)
+            foundDistances.append(distances[mask])
+        return np.concatenate(foundIndices), np.concatenate(foundDistances)
+
+    # returns (index positions, distances from start) of every point within width of the start -> end segment
+    def query_capsule(self, start, end, width):
+        start = np.asarray(start, dtype=np.float64)
+        end = np.asarray(end, dtype=np.float64)
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        # spheres of radius width + step/2 around samples step apart cover the whole capsule
+        step = max(width, self.cellSize)
+        sampleCount = int(math.ceil(math.dist(start, end) / step)) + 1
+        samples = start + (end - start) * np.linspace(0, 1, sampleCount)[:, None]
+        candidateList = []
+        for sample in samples:
+            candidates = self.cell_candidates(sample, width + step * 0.5)
+            if candidates is None:
+                return self.scan_capsule(start, end, width)
+            candidateList.append(candidates)
+        candidates = np.unique(np.concatenate(candidateList))
+
+        mask = segment_distances(self.xyz[candidates], start, end) <= width
+        candidates = candidates[mask]
+        return candidates, distances_from(self.xyz[candidates], start)
+
+    def scan_capsule(self, start, end, width):
+        foundIndices = []
+        for begin in range(0, len(self), scan_batch_size):
+            stop = min(begin + scan_batch_size, len(self))
+            mask = segment_distances(self.xyz[begin:stop], start, end) <= width
+            foundIndices.append(np.flatnonzero(mask) + begin)
+        indices = np.concatenate(foundIndices)
+        return indices, distances_from(self.xyz[indices], start)
+
+    def capsule_batch(self, start, end, width):
+        indices, distances = self.query_capsule(start, end, width)
+        names = [self.get_name(index) for index in indices]
+        return SystemBatch(names, self.xyz[indices], distances)
+
+    # radius query packed as a SystemBatch
+    def query_batch(self, center, radius, minRadius=None):
+        indices, distances = self.query_radius(center, radius, minRadius)
+        names = [self.get_name(index) for index in indices]
+        return SystemBatch(names, self.xyz[indices], distances)
+
+    def get_name(self, index):
+        return self.store.get_name(self.rows[index])
+
+    def get_coords(self, index):
+        x, y, z = self.xyz[index]
+        return {"x": float(x), "y": float(y), "z": float(z)}
+
+# sorts the store's coordinates by grid cell and writes the index files
+def build_spatial_index(store, path, cellSize=default_cell_size):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    xyz = np.empty((len(store), 3), dtype=np.float32)
+    xyz[:, 0] = store.x
+    xyz[:, 1] = store.y
+    xyz[:, 2] = store.z
+    if len(xyz):
+        origin = xyz.min(axis=0).astype(np.float64)
+        cells = np.floor((xyz - origin) / cellSize).astype(np.int64)
+        dims = cells.max(axis=0) + 1
+    else:
+        origin = np.zeros(3, dtype=np.float64)
+        cells = np.zeros((0, 3), dtype=np.int64)
+        dims = np.ones(3, dtype=np.int64)
+
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    del cells
+    rows = np.argsort(keys, kind="stable")
+
+    np.save(os.path.join(path, "xyz.npy"), xyz[rows])
+    np.save(os.path.join(path, "keys.npy"), keys[rows])
+    np.save(os.path.join(path, "rows.npy"), rows)
+
+    meta = {
+        "cellSize": cellSize,
+        "origin": origin.tolist(),
+        "dims": dims.tolist(),
+        "count": len(xyz)
+    }
+    with open(os.path.join(path, "meta.json"), 'w', encoding ='utf8') as json_file:
+        json.dump(meta, json_file)
+
+def has_spatial_index(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+# memory maps the index so startup only touches the pages a query needs
+def load_spatial_index(path, store):
+    if not has_spatial_index(path) or store is None:
+        return None
+
+    with open(os.path.join(path, "meta.json"), 'r', encoding ='utf8') as json_file:
+        meta = json.load(json_file)
+    if meta["count"] != len(store):
+        print("ERROR: System spatial index does not match the coords store, please rebuild it.")
+        return None
+
+    arrays = []
+    for name in ["xyz", "keys", "rows"]:
+        arrays.append(np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+    return SpatialIndex(*arrays, meta, store)
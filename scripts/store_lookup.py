@@ -0,0 +1,93 @@
+import os
+import json
+import struct
+
+from .name_index import name_hash
+
+# single system lookups read straight from the coords store and name index files,
+# so one-off lookups (i.e the command line) don't import numpy or map whole columns
+# the byte layout follows coords_store.column_files and the .npy files name_index writes
+store_formats = {
+    "x.bin" : "<f",
+    "y.bin" : "<f",
+    "z.bin" : "<f",
+    "name_offsets.bin" : "<q",
+}
+index_formats = {
+    "hashes.npy" : "<Q",
+    "rows.npy" : "<q",
+    "buckets.npy" : "<q",
+}
+
+def read_meta(path):
+    metaFile = os.path.join(path, "meta.json")
+    if not os.path.isfile(metaFile):
+        return None
+    with open(metaFile, 'r', encoding ='utf8') as json_file:
+        return json.load(json_file)
+
+# true if the store and a name index built for it are both there
+def has_lookup(storePath, indexPath):
+    storeMeta = read_meta(storePath)
+    indexMeta = read_meta(indexPath)
+    return storeMeta is not None and indexMeta is not None and indexMeta.get("count") == storeMeta["count"]
+
+# where the data starts in an .npy file, after the magic, version and header
+def npy_data_offset(f):
+    f.seek(6)
+    major = f.read(2)[0]
+    if major == 1:
+        return 10 + struct.unpack("<H", f.read(2))[0]
+    return 12 + struct.unpack("<I", f.read(4))[0]
+
+# values at rows of a column file that's already open
+def read_values(f, fmt, rows, dataOffset=0):
+    size = struct.calcsize(fmt)
+    result = []
+    for row in rows:
+        f.seek(dataOffset + row * size)
+        result.append(struct.unpack(fmt, f.read(size))[0])
+    return result
+
+# store rows named systemName, found through the name index
+def lookup_rows(storePath, indexPath, systemName):
+    bits = read_meta(indexPath)["bits"]
+    hashValue = name_hash(systemName)
+    bucket = hashValue >> (64 - bits)
+    files = {}
+    try:
+        for fName in index_formats:
+            files[fName] = open(os.path.join(indexPath, fName), 'rb')
+        offsets = {fName: npy_data_offset(files[fName]) for fName in files}
+        begin, end = read_values(files["buckets.npy"], index_formats["buckets.npy"], [bucket, bucket + 1], offsets["buckets.npy"])
+        positions = range(begin, end)
+        hashes = read_values(files["hashes.npy"], index_formats["hashes.npy"], positions, offsets["hashes.npy"])
+        positions = [position for position, value in zip(positions, hashes) if value == hashValue]
+        rows = read_values(files["rows.npy"], index_formats["rows.npy"], positions, offsets["rows.npy"])
+    finally:
+        for f in files.values():
+            f.close()
+    # hashes can collide, the stored name decides
+    return [row for row in rows if read_name(storePath, row) == systemName]
+
+def read_name(storePath, row):
+    with open(os.path.join(storePath, "name_offsets.bin"), 'rb') as f:
+        begin, end = read_values(f, store_formats["name_offsets.bin"], [row, row + 1])
+    with open(os.path.join(storePath, "names.bin"), 'rb') as f:
+        f.seek(begin)
+        return f.read(end - begin).decode("utf8")
+
+def read_coords(storePath, row):
+    coords = {}
+    for axis in ["x", "y", "z"]:
+        fName = axis + ".bin"
+        with open(os.path.join(storePath, fName), 'rb') as f:
+            coords[axis] = read_values(f, store_formats[fName], [row])[0]
+    return coords
+
+# {"x", "y", "z"} of systemName, None if it isn't in the store, needs has_lookup
+def lookup_system_coords(storePath, indexPath, systemName):
+    rows = lookup_rows(storePath, indexPath, systemName)
+    if not rows:
+        return None
+    return read_coords(storePath, rows[0])
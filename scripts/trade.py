@@ -0,0 +1,316 @@
+import threading
+import numpy as np
+
+# market fields kept per commodity, in the order of the value rows
+market_fields = ["buyPrice", "sellPrice", "stock", "demand"]
+# same threshold MarketInfo uses to call a commodity demanded
+demand_threshold = 5
+
+# commodity id -> column, shared by every market so tables of different stations line up
+# plans may run on several threads (i.e the planner service), new columns are added under the lock
+class CommodityColumns:
+    def __init__(self):
+        self.columns = {}
+        self.ids = []
+        self.names = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, commodityId, name):
+        column = self.columns.get(commodityId)
+        if column is not None:
+            return column
+        with self.lock:
+            if commodityId not in self.columns:
+                # ids and names first, so a column handed out always has them
+                self.ids.append(commodityId)
+                self.names.append(name)
+                self.columns[commodityId] = len(self.ids) - 1
+            return self.columns[commodityId]
+
+    # columns of many commodities at once, i.e of every price matrix column
+    def columns_of(self, commodityIds, names):
+        return np.array([self.column(commodityId, name) for commodityId, name in zip(commodityIds, names)], dtype=np.int64)
+
+commodity_columns = CommodityColumns()
+
+# (columns, values) of a market record list, values is (len(market_fields) x n) int64
+def sparse_market(marketD):
+    if not marketD:
+        return np.zeros(0, dtype=np.int64), np.zeros((len(market_fields), 0), dtype=np.int64)
+    columns = np.array([commodity_columns.column(market["id"], market["name"]) for market in marketD], dtype=np.int64)
+    values = np.array([[market.get(field) or 0 for market in marketD] for field in market_fields], dtype=np.int64)
+    return columns, values
+
+# sparse markets of price matrix rows, straight from the matrix without market records in between
+# price_matrix.price_fields is in market_fields order, only the columns are mapped
+def sparse_matrix_markets(priceMatrix, rows):
+    mapping = commodity_columns.columns_of(priceMatrix.commodityIds, priceMatrix.commodityNames)
+    return [(mapping[columns], values) for columns, values in priceMatrix.sparse_rows(rows)]
+
+# dense (stations x commodities) arrays for a list of StationInfo
+class MarketTable:
+    def __init__(self, stations):
+        self.stations = stations
+        shape = (len(stations), len(commodity_columns))
+        for field in market_fields:
+            setattr(self, field, np.zeros(shape, dtype=np.int64))
+
+        rowList = []
+        columnList = []
+        valueList = []
+        for row, station in enumerate(stations):
+            columns, values = station.marketInfo.sparse
+            rowList.append(np.full(len(columns), row, dtype=np.int64))
+            columnList.append(columns)
+            valueList.append(values)
+        if rowList:
+            rows = np.concatenate(rowList)
+            columns = np.concatenate(columnList)
+            values = np.concatenate(valueList, axis=1)
+            for id, field in enumerate(market_fields):
+                getattr(self, field)[rows, columns] = values[id]
+
+    def __len__(self):
+        return len(self.stations)
+
+    # pads the tables with empty columns for commodities registered after they were built
+    def resize(self, width):
+        for field in market_fields:
+            table = getattr(self, field)
+            if table.shape[1] < width:
+                setattr(self, field, np.pad(table, ((0, 0), (0, width - table.shape[1]))))
+
+    # what a station can sell us, and what a station wants bought, same rules as MarketInfo
+    def supply(self):
+        return self.stock > 0
+
+    def demanded(self):
+        return self.demand > self.stock - demand_threshold
+
+# best cargo for every source x target station pair, all pairs at once
+# each commodity is capped by the source's stock and the target's demand,
+# and by what's left of capital (credits) if given
+class PairTrades:
+    def __init__(self, sources: MarketTable, targets: MarketTable, cargoSpace, capital=None):
+        self.sources = sources
+        self.targets = targets
+        self.cargoSpace = cargoSpace
+        self.capital = capital
+        sources.resize(len(commodity_columns))
+        targets.resize(len(commodity_columns))
+
+        # (sources x targets x commodities) profit per unit, zero where the trade isn't possible
+        unitProfit = targets.sellPrice[None, :, :] - sources.buyPrice[:, None, :]
+        valid = sources.supply()[:, None, :] & targets.demanded()[None, :, :] & (unitProfit > 0)
+        unitProfit = np.where(valid, unitProfit, 0)
+
+        # sort once per pair, then fill cargo from the most profitable commodity down
+        self.order = np.argsort(-unitProfit, axis=2, kind="stable")
+        self.unitProfit = np.take_along_axis(unitProfit, self.order, axis=2)
+        caps = np.minimum(sources.stock[:, None, :], targets.demand[None, :, :])
+        caps = np.where(self.unitProfit > 0, np.take_along_axis(caps, self.order, axis=2), 0)
+        if capital is None:
+            self.counts = fill_sorted(caps, cargoSpace)
+        else:
+            buyPrices = np.take_along_axis(np.broadcast_to(sources.buyPrice[:, None, :], unitProfit.shape), self.order, axis=2)
+            self.counts = fill_sorted_capital(caps, buyPrices, cargoSpace, capital)
+        self.profits = (self.counts * self.unitProfit).sum(axis=2)
+
+    def profit(self, source, target):
+        return int(self.profits[source, target])
+
+    # bought commodities of one pair, in the route item format
+    def items(self, source, target):
+        result = []
+        counts = self.counts[source, target]
+        for position in np.flatnonzero(counts > 0).tolist():
+            column = int(self.order[source, target, position])
+            count = int(counts[position])
+            result.append({
+                "itemId" : commodity_columns.ids[column],
+                "itemName" : commodity_columns.names[column],
+                "count" : count,
+                "profit" : count * int(self.unitProfit[source, target, position])
+            })
+        return result
+
+# greedy fill along the last axis: take each cap in order until cargoSpace is used up
+def fill_sorted(caps, cargoSpace):
+    before = np.cumsum(caps, axis=-1) - caps
+    return np.clip(cargoSpace - before, 0, caps)
+
+# fill_sorted with a credit limit, capital left after one commodity bounds the next,
+# so it steps along the commodities while staying vectorized over everything else
+def fill_sorted_capital(caps, buyPrices, cargoSpace, capital):
+    counts = np.zeros(caps.shape, dtype=np.int64)
+    cargoLeft = np.full(caps.shape[:-1], cargoSpace, dtype=np.int64)
+    capitalLeft = np.full(caps.shape[:-1], capital, dtype=np.int64)
+    used = np.flatnonzero(caps.reshape(-1, caps.shape[-1]).any(axis=0)) if caps.size else []
+    for position in range(used[-1] + 1 if len(used) else 0):
+        price = buyPrices[..., position]
+        affordable = np.where(price > 0, capitalLeft // np.maximum(price, 1), cargoLeft)
+        take = np.minimum(np.minimum(caps[..., position], cargoLeft), affordable)
+        counts[..., position] = take
+        cargoLeft -= take
+        capitalLeft -= take * price
+    return counts
+
+# how many systems ahead a deviation stop can trade with, the first and last group always reach everything
+default_stop_window = 8
+
+# Dinkelbach steps for best_rate, it usually settles in 3 or 4
+max_rate_iterations = 12
+
+# best chains of trade stops through systems in route order
+# groups is a list of station lists, groups[0] the start system and groups[-1] the destination;
+# a route buys at one station and sells (then buys again) at the next, stations only move forward,
+# legSeconds(source group, target group), if given, returns the time of a leg into each target station,
+# so routes can be ranked by credits per hour with best_rate, each stop in between then adds stopSeconds to the time
+# legs are computed once per group block, so the work grows with groups x window, not with every combination
+class StopSearch:
+    def __init__(self, groups, cargoSpace, capital=None, maxStops=1, stopSeconds=0, window=default_stop_window, legSeconds=None):
+        self.groups = groups
+        self.cargoSpace = cargoSpace
+        self.capital = capital
+        self.maxStops = maxStops
+        self.stopSeconds = stopSeconds
+        self.timed = legSeconds is not None
+
+        # flat station numbering, group g owns stations [offsets[g], offsets[g+1])
+        self.stations = [station for group in groups for station in group]
+        self.offsets = np.cumsum([0] + [len(group) for group in groups])
+        tables = [MarketTable(group) for group in groups]
+
+        # (source, target) -> (profits with -inf for no trade, seconds into each target station or None)
+        self.blocks = {}
+        last = len(groups) - 1
+        for target in range(1, last + 1):
+            for source in range(target):
+                if not (source == 0 or target == last or target - source <= window):
+                    continue
+                if not len(groups[source]) or not len(groups[target]):
+                    continue
+                profits = PairTrades(tables[source], tables[target], cargoSpace, capital).profits
+                seconds = np.asarray(legSeconds(source, target), dtype=np.float64) if legSeconds else None
+                # a stop in between takes stopSeconds on top of the leg into it
+                if seconds is not None and target != last:
+                    seconds = seconds + stopSeconds
+                self.blocks[(source, target)] = (np.where(profits > 0, profits, -np.inf), seconds)
+        self.solve()
+
+    # value[k, s]: best score arriving at station s as the k-th stop, parent[k, s] the station before it
+    # score is profit minus rate credits per hour of travel
+    def solve(self, rate=0):
+        count = len(self.stations)
+        self.value = np.full((self.maxStops + 1, count), -np.inf)
+        self.parent = np.full((self.maxStops + 1, count), -1, dtype=np.int64)
+        self.value[0, self.offsets[0]:self.offsets[1]] = 0
+        # the destination's stations, per number of stops made before reaching it
+        self.finalValue = np.full((self.maxStops + 1, len(self.groups[-1])), -np.inf)
+        self.finalParent = np.full((self.maxStops + 1, len(self.groups[-1])), -1, dtype=np.int64)
+
+        # blocks were made in target order, so every source is final before it's extended
+        for (source, target), (profits, seconds) in self.blocks.items():
+            weights = profits
+            if rate and seconds is not None:
+                weights = weights - rate * seconds[None, :] / 3600
+            self.relax(source, target, weights)
+
+    # extends every route ending in group source by one leg into group target
+    def relax(self, source, target, weights):
+        last = len(self.groups) - 1
+        sourceBegin = self.offsets[source]
+        sourceEnd = self.offsets[source + 1]
+        targetBegin = self.offsets[target]
+        for stops in range(self.maxStops + 1):
+            arriving = self.value[stops, sourceBegin:sourceEnd]
+            if not np.isfinite(arriving).any():
+                continue
+            candidates = arriving[:, None] + weights
+            best = candidates.argmax(axis=0)
+            bestValue = candidates[best, np.arange(candidates.shape[1])]
+            if target == last:
+                values, parents = self.finalValue[stops], self.finalParent[stops]
+                begin = 0
+            elif stops < self.maxStops:
+                values, parents = self.value[stops + 1], self.parent[stops + 1]
+                begin = targetBegin
+            else:
+                continue
+            view = slice(begin, begin + len(bestValue))
+            better = bestValue > values[view]
+            values[view] = np.where(better, bestValue, values[view])
+            parents[view] = np.where(better, best + sourceBegin, parents[view])
+
+    # (score, profit, seconds, station path) of the best route with exactly stops stops in between,
+    # None if there's none, seconds is None without legSeconds
+    def best(self, stops):
+        finalValue = self.finalValue[stops]
+        if not np.isfinite(finalValue).any():
+            return None
+        end = int(finalValue.argmax())
+        path = [int(self.offsets[-2]) + end]
+        station = int(self.finalParent[stops, end])
+        for k in range(stops, -1, -1):
+            path.append(station)
+            station = int(self.parent[k, station])
+        path.reverse()
+        profit, seconds = self.path_totals(path)
+        return float(finalValue[end]), profit, seconds, path
+
+    # best route over every allowed number of stops, by score
+    def best_any(self, minStops=0):
+        results = [self.best(stops) for stops in range(minStops, self.maxStops + 1)]
+        results = [result for result in results if result]
+        if not results:
+            return None
+        return max(results, key=lambda result: result[0])
+
+    # best route by profit per hour, found with Dinkelbach's method:
+    # solve for profit - rate * hours, set rate to what the winner earns per hour, repeat until it stops improving
+    # returns the same tuple as best, with credits per hour as the score
+    # without legSeconds there's no time to divide by, the best_any (profit) result is returned instead
+    def best_rate(self, minStops=0):
+        if not self.timed:
+            return self.best_any(minStops)
+        rate = 0
+        bestResult = None
+        for iteration in range(max_rate_iterations):
+            self.solve(rate)
+            result = self.best_any(minStops)
+            if result is None:
+                break
+            score, profit, seconds, path = result
+            newRate = profit * 3600 / max(seconds, 1)
+            if bestResult is not None and newRate <= rate * (1 + 1e-9):
+                break
+            rate = newRate
+            bestResult = (newRate, profit, seconds, path)
+        return bestResult
+
+    # (profit, seconds) along a station path
+    def path_totals(self, path):
+        profit = 0
+        seconds = 0.0
+        for fromId, toId in zip(path, path[1:]):
+            source = self.group_of(fromId)
+            target = self.group_of(toId)
+            profits, legSeconds = self.blocks[(source, target)]
+            profit += int(profits[fromId - self.offsets[source], toId - self.offsets[target]])
+            if legSeconds is not None:
+                seconds += float(legSeconds[toId - self.offsets[target]])
+        return profit, (seconds if self.timed else None)
+
+    def group_of(self, station):
+        return int(np.searchsorted(self.offsets, station, side="right")) - 1
+
+    # (items, profit) of every leg along a station path
+    def legs(self, path):
+        result = []
+        for fromId, toId in zip(path, path[1:]):
+            trades = PairTrades(MarketTable([self.stations[fromId]]), MarketTable([self.stations[toId]]), self.cargoSpace, self.capital)
+            result.append((trades.items(0, 0), trades.profit(0, 0)))
+        return result
@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+# tests import the package the same way ldt.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import coords_store as cs
+from scripts import name_index as ni
+from scripts import spatial_index as si
+from scripts import offline_database as od
+
+# small random systems, clustered so some grid cells are crowded and others empty
+def random_points(seed, count, spread=200.0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-spread, spread, size=(4, 3))
+    points = centers[rng.integers(0, len(centers), size=count)] + rng.normal(0, spread / 4, size=(count, 3))
+    # float32 like the store, so brute force and the index see the same coordinates
+    return points.astype(np.float32).astype(np.float64)
+
+def write_store(path, points, names=None):
+    names = names or ["System {}".format(i) for i in range(len(points))]
+    writer = cs.CoordsStoreWriter(str(path))
+    for id, (name, (x, y, z)) in enumerate(zip(names, points)):
+        writer.add(id, name, x, y, z)
+    writer.close()
+    return cs.load_coords_store(str(path))
+
+@pytest.fixture
+def points():
+    return random_points(1, 600)
+
+@pytest.fixture
+def store(tmp_path, points):
+    return write_store(tmp_path / "coords", points)
+
+# offline_database paths are fixed on import, these are pointed into tmp_path instead
+dataset_paths = ["offline_database_path", "populated_system_file", "system_stations_file", "station_market_path",
+                 "station_market_index_file", "system_coords_path", "system_coords_store_path", "system_index_path",
+                 "system_name_index_path", "station_prices_path", "dataset_version_file"]
+
+# offline_database over a small synthetic dataset: coords store, both indexes and a station list
+# for every 10th system, the module's OD is a fresh one for each test
+@pytest.fixture
+def offline_database(tmp_path, monkeypatch, points):
+    base = od.offline_database_path
+    for name in dataset_paths:
+        monkeypatch.setattr(od, name, getattr(od, name).replace(base, str(tmp_path / "database"), 1))
+    store = write_store(od.system_coords_store_path, points)
+    si.build_spatial_index(store, od.system_index_path)
+    ni.build_name_index(np.asarray(store.nameHashes), od.system_name_index_path)
+    systemStations = {}
+    for id in range(0, len(points), 10):
+        systemStations["System {}".format(id)] = [{"id": id, "marketId": id, "type": "Coriolis Starport", "name": "Port {}".format(id), "distanceToArrival": 100}]
+    with open(od.system_stations_file, 'w', encoding ='utf8') as json_file:
+        json.dump(systemStations, json_file)
+    monkeypatch.setattr(od, "OD", od.LazyOfflineDatabase(od.offline_database_path))
+    return od
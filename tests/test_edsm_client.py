@@ -0,0 +1,144 @@
+import json
+import time
+import socket
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import pytest
+
+from scripts import api_edsm
+from scripts.edsm_client import EdsmClient
+
+# local stand-in for EDSM, answers by path and counts requests and how many run at once
+class StubEdsm:
+    def __init__(self):
+        self.requests = []
+        self.inFlight = 0
+        self.maxInFlight = 0
+        self.failures = {}   # id -> 503 answers left before a 200
+        self.lock = threading.Lock()
+
+    def answer(self, path, query):
+        if path == "/flaky":
+            with self.lock:
+                left = self.failures.get(query["id"], 0)
+                self.failures[query["id"]] = left - 1
+            return (503, "busy") if left > 0 else (200, {"id": query["id"]})
+        if path == "/busy":
+            return 503, "busy"
+        if path == "/missing":
+            return 404, "<html>not found</html>"
+        if path == "/html":
+            return 200, "<html>maintenance</html>"
+        if path == "/slow":
+            time.sleep(float(query["delay"]))
+            return 200, {"id": query["id"]}
+        if path == "/api-v1/system":
+            information = {} if query["systemName"].startswith("Anarchy") else {"government": "Democracy"}
+            return 200, {"name": query["systemName"], "information": information}
+        if path == "/api-system-v1/stations/market":
+            if query["stationName"] == "Closed":
+                return 200, {}
+            return 200, {"commodities": [{"id": "gold", "name": "Gold", "buyPrice": len(query["stationName"])}]}
+        return 404, "unknown"
+
+    def handle(self, handler):
+        parts = urlsplit(handler.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        with self.lock:
+            self.requests.append(handler.path)
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+        try:
+            status, body = self.answer(parts.path, query)
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf8")
+        handler.send_response(status)
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def count(self, path):
+        return len([request for request in self.requests if urlsplit(request).path == path])
+
+@pytest.fixture
+def stub():
+    stub = StubEdsm()
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            stub.handle(self)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub.url = "http://127.0.0.1:{}".format(server.server_address[1])
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client():
+    return EdsmClient(maxConcurrency=3, retries=3, backoff=0)
+
+def test_retries_busy_answers(stub, client):
+    stub.failures["a"] = 2
+    assert client.get_json(stub.url + "/flaky?id=a") == {"id": "a"}
+    assert stub.count("/flaky") == 3
+
+def test_gives_up_after_retries(stub, client):
+    assert client.get_json(stub.url + "/busy") is None
+    assert stub.count("/busy") == client.retries + 1
+
+# not found and non json answers aren't outages, they're not asked again
+@pytest.mark.parametrize("path", ["/missing", "/html"])
+def test_errors_fail_at_once(stub, client, path):
+    assert client.get_json(stub.url + path) is None
+    assert stub.count(path) == 1
+
+def test_retries_connection_errors(client):
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+    assert client.get_json("http://127.0.0.1:{}/flaky?id=a".format(port)) is None
+
+def test_many_keeps_order_and_bounds_concurrency(stub, client):
+    urls = ["{}/slow?id={}&delay={}".format(stub.url, i, 0.05 * (i % 3)) for i in range(12)]
+    stub.failures["x"] = 1
+    urls.append(stub.url + "/flaky?id=x")
+    results = client.get_json_many(urls)
+    assert results == [{"id": str(i)} for i in range(12)] + [{"id": "x"}]
+    assert 2 <= stub.maxInFlight <= client.maxConcurrency
+
+# notebooks call the blocking api from inside a running event loop
+def test_many_inside_running_loop(stub, client):
+    async def plan():
+        return client.get_json_many([stub.url + "/slow?id=1&delay=0", stub.url + "/slow?id=2&delay=0"])
+    assert asyncio.run(plan()) == [{"id": "1"}, {"id": "2"}]
+
+def test_many_empty(client):
+    assert client.get_json_many([]) == []
+
+@pytest.fixture
+def api(stub, monkeypatch):
+    monkeypatch.setattr(api_edsm, "edsm_url", stub.url)
+    monkeypatch.setattr(api_edsm, "client", EdsmClient(maxConcurrency=3, retries=1, backoff=0))
+    return api_edsm
+
+def test_is_system_anarchy_many(api, stub):
+    result = api.is_system_anarchy_many(["Sol", "Anarchy One", "Sol", "Achenar"])
+    assert result == {"Sol": False, "Anarchy One": True, "Achenar": False}
+    assert stub.count("/api-v1/system") == 3
+
+def test_get_market_data_many(api, stub):
+    locations = [("Sol", "Galileo"), ("Sol", "Closed"), ("Achenar", "Dawes Hub")]
+    result = api.get_market_data_many(locations + [("Sol", "Galileo")])
+    assert list(result) == locations
+    assert result[("Sol", "Galileo")][0]["buyPrice"] == len("Galileo")
+    assert result[("Sol", "Closed")] is None
+    assert result[("Achenar", "Dawes Hub")][0]["buyPrice"] == len("Dawes Hub")
@@ -0,0 +1,134 @@
+import os
+import sys
+import gzip
+import json
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# dataset paths are taken from the working directory on import, so every step runs in its own
+# interpreter inside tmp_path; the dumps are put where update_all would download them
+prelude = """
+import json
+from scripts import offline_database as od
+from scripts import offline_database_edsm as ed
+od.OfflineDatabase.download_file = lambda self, url: None
+ed.shard_count = 64
+"""
+
+def run(path, code):
+    result = subprocess.run([sys.executable, "-c", prelude + code], cwd=str(path), capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=root), timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# EDSM layout, "[" then one record per line
+def write_dump(path, name, records):
+    raw = path / "database_raw_edsm"
+    raw.mkdir(exist_ok=True)
+    with gzip.open(str(raw / name), "wt", encoding="utf8") as f:
+        f.write("[\n" + ",\n".join(json.dumps(record) for record in records) + "\n]\n")
+
+def system(i):
+    return {"id": i, "name": "Sys {}".format(i), "coords": {"x": i * 3.0, "y": (i % 7) * 2.0, "z": -1.5}}
+
+def station(i, buyPrice, updated):
+    return {"id": i * 10, "marketId": 9000 + i, "name": "St {}".format(i), "type": "Coriolis Starport",
+            "haveMarket": True, "haveShipyard": False, "systemName": "Sys {}".format(i),
+            "updateTime": {"market": updated},
+            "commodities": [{"id": "gold", "name": "Gold", "buyPrice": buyPrice, "sellPrice": 9500, "stock": 10, "demand": 5}]}
+
+def populated(i):
+    record = dict(system(i))
+    record["information"] = {"government": "Democracy"}
+    record["stations"] = [{key: station(i, 0, "")[key] for key in ["id", "marketId", "name", "type", "haveMarket"]}]
+    return record
+
+def write_full_dumps(path, count):
+    write_dump(path, "systemsWithCoordinates.json.gz", [system(i) for i in range(count)])
+    write_dump(path, "systemsPopulated.json.gz", [populated(i) for i in range(0, count, 10)])
+    write_dump(path, "stations.json.gz", [station(i, 9000 + i, "2026-01-01 00:00:00") for i in range(0, count, 10)])
+
+query = """
+result = {
+    "version": od.get_dataset_version(),
+    "systems": len(od.OD.coordsStore),
+    "coords": [od.get_system_coord("Sys {}".format(i)) for i in QUERIED],
+    "stations": od.get_stations("Sys 20"),
+    "markets": {str(i): od.get_market_data("Sys {}".format(i), "St {}".format(i)) for i in MARKETS},
+}
+print(json.dumps(result))
+"""
+
+def run_query(path, systems, markets):
+    return run(path, query.replace("QUERIED", repr(systems)).replace("MARKETS", repr(markets)))
+
+def buy_price(market):
+    return {commodity["name"]: commodity["buyPrice"] for commodity in market}["Gold"]
+
+def test_update_all_streams_every_dump(tmp_path):
+    write_full_dumps(tmp_path, 500)
+    run(tmp_path, "ed.OfflineDatabase_EDSM().update_all(workers=2)\nprint('{}')")
+    # downloaded dumps are removed once extracted
+    assert not [name for name in os.listdir(str(tmp_path / "database_raw_edsm")) if name.endswith(".gz")]
+
+    result = run_query(tmp_path, [0, 137, 499], [0, 20, 490])
+    assert result["version"] == 1
+    assert result["systems"] == 500
+    assert result["coords"] == [system(i)["coords"] for i in [0, 137, 499]]
+    assert result["stations"] == ["St 20"]
+    assert {i: buy_price(market) for i, market in result["markets"].items()} == {"0": 9000, "20": 9020, "490": 9490}
+
+def test_update_incremental_patches_the_dataset(tmp_path):
+    write_full_dumps(tmp_path, 500)
+    run(tmp_path, "ed.OfflineDatabase_EDSM().update_all(workers=2)\nprint('{}')")
+
+    # the 7 days dump repeats some known systems next to new ones,
+    # only markets updated after the last watermark (and new stations) are written again
+    write_dump(tmp_path, "systemsWithCoordinates7days.json.gz", [system(i) for i in range(480, 520)])
+    stations = [station(i, 9000 + i, "2026-01-01 00:00:00") for i in range(0, 500, 10)]
+    stations[2] = station(20, 7777, "2026-02-01 00:00:00")
+    stations.append(station(510, 5555, "2026-01-01 00:00:00"))
+    write_dump(tmp_path, "stations.json.gz", stations)
+    run(tmp_path, "ed.OfflineDatabase_EDSM().update_incremental()\nprint('{}')")
+
+    result = run_query(tmp_path, [0, 499, 519], [0, 20, 510])
+    assert result["version"] == 2
+    assert result["systems"] == 520
+    assert result["coords"] == [system(i)["coords"] for i in [0, 499, 519]]
+    assert {i: buy_price(market) for i, market in result["markets"].items()} == {"0": 9000, "20": 7777, "510": 5555}
+
+# every incremental run adds a delta file, past max_market_deltas they're merged into one
+# holding only the records the index still points at
+def test_update_incremental_compacts_market_deltas(tmp_path):
+    write_full_dumps(tmp_path, 100)
+    run(tmp_path, "ed.OfflineDatabase_EDSM().update_all(workers=2)\nprint('{}')")
+
+    inspect = """
+import os
+ed.max_market_deltas = 2
+database = ed.OfflineDatabase_EDSM()
+database.update_incremental()
+marketIndex = database.get_market_index()
+print(json.dumps({
+    "files": sorted(name for name in os.listdir(database.station_market_path) if name.startswith("station_market_delta_")),
+    "entries": {id: marketIndex[id][0] for id in ["0", "100", "200", "300"]},
+    "prices": {id: database.read_market_record(marketIndex[id])["commodities"][0]["buyPrice"] for id in ["0", "100", "200", "300"]},
+}))
+"""
+    files = []
+    for run_id, updated in enumerate([1, 2, 3, 1]):
+        write_dump(tmp_path, "systemsWithCoordinates7days.json.gz", [system(0)])
+        stations = [station(i, 9000 + i, "2026-01-01 00:00:00") for i in range(0, 100, 10)]
+        # station `updated` gets a newer market each run
+        stations[updated] = station(updated * 10, 100 + run_id, "2026-02-0{} 00:00:00".format(run_id + 1))
+        write_dump(tmp_path, "stations.json.gz", stations)
+        result = run(tmp_path, inspect)
+        files.append(result["files"])
+
+    assert files[:2] == [["station_market_delta_2.json"], ["station_market_delta_2.json", "station_market_delta_3.json"]]
+    # the third delta went over the limit, the fourth is the only one since
+    assert files[2:] == [["station_market_delta_compact_4.json"], ["station_market_delta_5.json", "station_market_delta_compact_4.json"]]
+    assert result["entries"] == {"0": "station_market_0.json", "100": "station_market_delta_5.json",
+                                 "200": "station_market_delta_compact_4.json", "300": "station_market_delta_compact_4.json"}
+    assert result["prices"] == {"0": 9000, "100": 103, "200": 101, "300": 102}
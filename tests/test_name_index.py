@@ -0,0 +1,48 @@
+import numpy as np
+
+from scripts import name_index as ni
+from conftest import random_points, write_store
+
+def names_of(count):
+    # a few duplicates, the index has to return every row of a name
+    return ["Col {} Sector {}".format(i % 37, i) for i in range(count)] + ["Sol", "Sol", "Ålmhult"]
+
+def test_lookup_matches_dict(tmp_path):
+    names = names_of(2000)
+    ni.build_name_index([ni.name_hash(name) for name in names], str(tmp_path / "index"))
+    index = ni.load_name_index(str(tmp_path / "index"))
+
+    expected = {}
+    for row, name in enumerate(names):
+        expected.setdefault(name, []).append(row)
+    for name, rows in expected.items():
+        assert sorted(index.lookup(name)) == rows
+    assert index.lookup("Not A System") == []
+
+def test_name_hash_is_stable():
+    # the hash is written to disk, it must not change between runs or versions
+    assert ni.name_hash("Sol") == ni.name_hash("Sol")
+    assert ni.name_hash("Sol") != ni.name_hash("sol")
+    assert 0 <= ni.name_hash("Sol") < 2 ** 64
+
+def test_store_rows_through_index(tmp_path):
+    names = names_of(300)
+    store = write_store(tmp_path / "coords", random_points(6, len(names)), names)
+    ni.build_name_index(np.asarray(store.nameHashes), str(tmp_path / "index"))
+    index = ni.load_name_index(str(tmp_path / "index"), store)
+    for name in ["Sol", "Ålmhult", names[123]]:
+        assert sorted(index.lookup(name)) == store.find_rows(name)
+
+# an index for a different number of systems is refused when the store is given
+def test_index_for_another_store_is_not_loaded(tmp_path):
+    names = names_of(50)
+    store = write_store(tmp_path / "coords", random_points(7, len(names)), names)
+    ni.build_name_index(np.asarray(store.nameHashes)[:-1], str(tmp_path / "index"))
+    assert ni.load_name_index(str(tmp_path / "index"), store) is None
+    assert ni.load_name_index(str(tmp_path / "index")) is not None
+
+def test_tiny_index(tmp_path):
+    ni.build_name_index([ni.name_hash("Sol")], str(tmp_path / "index"))
+    index = ni.load_name_index(str(tmp_path / "index"))
+    assert index.lookup("Sol") == [0]
+    assert index.lookup("Achenar") == []
@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+
+# warm_up maps the coords store and both indexes, so the first plan doesn't
+def test_warm_up_loads_the_indexes(offline_database):
+    od = offline_database
+    od.warm_up()
+    for name in od.lazy_attributes:
+        assert od.OD.get().__dict__.get(name) is not None
+
+# the first requests of the planner service can arrive together, each part is still loaded once
+def test_lazy_parts_load_once(offline_database, monkeypatch):
+    od = offline_database
+    database = od.OD.get()
+    loads = []
+    loadSpatialIndex = database.load_spatial_index
+    def slow_load():
+        loads.append(threading.get_ident())
+        time.sleep(0.05)
+        return loadSpatialIndex()
+    monkeypatch.setattr(database, "load_spatial_index", slow_load)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(database.spatialIndex)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+
+# the cache is keyed on mtime and size, a rewritten file is read again
+def test_load_cached_reloads_changed_files(offline_database, tmp_path):
+    database = offline_database.OD.get()
+    file = tmp_path / "cached.txt"
+    file.write_text("first")
+    loads = []
+    def loader(path):
+        loads.append(path)
+        return open(path).read()
+
+    assert database.load_cached(str(file), loader) == "first"
+    assert database.load_cached(str(file), loader) == "first"
+    assert len(loads) == 1
+
+    file.write_text("second version")
+    assert database.load_cached(str(file), loader) == "second version"
+
+    # same size, only the mtime moves
+    stat = os.stat(file)
+    file.write_text("third  version")
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert database.load_cached(str(file), loader) == "third  version"
+    assert len(loads) == 3
+
+    database.invalidate_cache(str(file))
+    assert database.load_cached(str(file), loader) == "third  version"
+    assert len(loads) == 4
+
+# a batch looks at the station list once, however many names it has
+def test_is_system_anarchy_many_resolves_once(offline_database, monkeypatch):
+    od = offline_database
+    od.is_system_anarchy("System 0")
+    stats = []
+    stat = os.stat
+    def counting_stat(path, *args, **kwargs):
+        if os.fspath(path) == od.system_stations_file:
+            stats.append(path)
+        return stat(path, *args, **kwargs)
+    monkeypatch.setattr(os, "stat", counting_stat)
+
+    counts = []
+    for count in [5, 200]:
+        names = ["System {}".format(id) for id in range(count)]
+        stats.clear()
+        assert od.is_system_anarchy_many(names) == {name: id % 10 != 0 for id, name in enumerate(names)}
+        counts.append(len(stats))
+    assert counts[0] == counts[1] < 5
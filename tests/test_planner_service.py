@@ -0,0 +1,129 @@
+import json
+import socket
+import http.client
+import pytest
+
+from scripts import classes
+from scripts import planner_service as ps
+
+known_systems = {"Sol": {"x": 0.0, "y": 0.0, "z": 0.0}, "Achenar": {"x": 67.5, "y": -119.5, "z": 24.8}}
+
+class FakeRoute:
+    def __init__(self, fromLocation, toLocation):
+        self.fromLocation = fromLocation
+        self.toLocation = toLocation
+
+    def to_dict(self):
+        return {"from": self.fromLocation, "to": self.toLocation}
+
+# answers plans from known_systems only, the offline dataset is never opened
+@pytest.fixture
+def planner(monkeypatch):
+    plans = []
+    def plan(self, curLocation, targetLocation, jumpCapacity, **kwargs):
+        plans.append((curLocation, targetLocation, jumpCapacity, kwargs))
+        self.routes = [FakeRoute(curLocation, targetLocation)] if targetLocation != "Achenar/Nowhere Dock" else []
+    monkeypatch.setattr(classes, "warm_up", lambda: None)
+    monkeypatch.setattr(classes, "get_dataset_version", lambda: 3)
+    monkeypatch.setattr(classes, "get_system_coord", lambda systemName, database: known_systems.get(systemName))
+    monkeypatch.setattr(classes, "get_stations", lambda systemName, noPlanet=True: ["Abraham Lincoln", "Nowhere Dock"] if systemName in known_systems else None)
+    monkeypatch.setattr(classes.TripPlanner, "plan", plan)
+    return plans
+
+@pytest.fixture
+def server(planner):
+    server = ps.serve_in_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    payload = body if isinstance(body, (bytes, type(None))) else json.dumps(body).encode("utf8")
+    connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+def test_parse_plan_request():
+    fromLocation, toLocation, jumpRange, kwargs = ps.parse_plan_request({
+        "from": "Sol/Abraham Lincoln", "to": "Achenar", "jumpRange": "18.5", "cargoSpace": "104", "engine": "astar",
+        "capital": None, "costModel": {"jumpSeconds": 50},
+    })
+    assert (fromLocation, toLocation, jumpRange) == ("Sol/Abraham Lincoln", "Achenar", 18.5)
+    assert kwargs["cargoSpace"] == 104 and kwargs["engine"] == "astar"
+    assert "capital" not in kwargs
+    assert kwargs["costModel"].jumpSeconds == 50
+
+@pytest.mark.parametrize("body", [
+    [],
+    {"from": "Sol", "to": "Achenar"},
+    {"from": "Sol", "to": "Achenar", "jumpRange": 0},
+    {"from": "Sol", "to": "Achenar", "jumpRange": "far"},
+    {"from": "Sol", "to": "Achenar", "jumpRange": 18, "engine": "dijkstra"},
+    {"from": "Sol", "to": "Achenar", "jumpRange": 18, "costModel": {"warpSpeed": 1}},
+])
+def test_parse_plan_request_rejects(body):
+    with pytest.raises(ps.RequestError):
+        ps.parse_plan_request(body)
+
+def test_health(server):
+    assert request(server, "GET", "/health") == (200, {"status": "ok", "datasetVersion": 3, "stations": len(classes.station_registry)})
+    assert request(server, "GET", "/nothing")[0] == 404
+
+def test_plan(server, planner):
+    status, data = request(server, "POST", "/plan", {"from": "Sol/Abraham Lincoln", "to": "Achenar", "jumpRange": 18, "maxStops": 2})
+    assert status == 200
+    assert data["routes"] == [{"from": "Sol/Abraham Lincoln", "to": "Achenar"}]
+    assert planner == [("Sol/Abraham Lincoln", "Achenar", 18.0, {"maxStops": 2})]
+
+@pytest.mark.parametrize("body, status", [
+    (b"{not json", 400),
+    ({"from": "Sol", "to": "Achenar", "jumpRange": 18, "engine": "dijkstra"}, 400),
+    ({"from": "", "to": "Achenar", "jumpRange": 18}, 400),
+    ({"from": "Sol", "to": "Nowhere", "jumpRange": 18}, 404),
+    ({"from": "Sol/Missing Port", "to": "Achenar", "jumpRange": 18}, 404),
+    ({"from": "Sol", "to": "Achenar/Nowhere Dock", "jumpRange": 18}, 404),
+])
+def test_plan_errors(server, planner, body, status):
+    result = request(server, "POST", "/plan", body)
+    assert result[0] == status
+    assert "error" in result[1]
+    if status == 400:
+        assert planner == []
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="no unix sockets")
+def test_unix_socket(tmp_path, planner):
+    socketPath = str(tmp_path / "planner.sock")
+    server = ps.serve_in_background(socketPath=socketPath)
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(10)
+        client.connect(socketPath)
+        client.sendall(b"GET /health HTTP/1.0\r\n\r\n")
+        response = b""
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.0 200")
+    assert json.loads(body)["datasetVersion"] == 3
+
+@pytest.mark.parametrize("length", ["ten", "-5"])
+def test_bad_content_length(server, planner, length):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    connection.putrequest("POST", "/plan")
+    connection.putheader("Content-Length", length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400
+    assert "Content-Length" in json.loads(response.read())["error"]
+    connection.close()
+    assert planner == []
@@ -0,0 +1,88 @@
+import pytest
+
+from scripts import response_cache as rc
+from scripts.edsm_client import EdsmClient
+
+market_url = "https://www.edsm.net/api-system-v1/stations/market?systemName=Sol&stationName=Galileo"
+coords_url = "https://www.edsm.net/api-v1/system?systemName=Sol&showCoordinates=1"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rc.time, "time", clock.time)
+    return clock
+
+@pytest.fixture
+def cache(tmp_path):
+    return rc.ResponseCache(str(tmp_path / "cache" / "edsm.sqlite"))
+
+def test_normalize_url():
+    assert rc.normalize_url("https://www.edsm.net/api-v1/system?b=2&a=1") == rc.normalize_url("http://other/api-v1/system?a=1&b=2")
+    assert rc.normalize_url("https://www.edsm.net/api-v1/system?a=1") != rc.normalize_url("https://www.edsm.net/api-v1/system?a=2")
+
+def test_ttl_for():
+    assert rc.ttl_for(coords_url) == (rc.forever, rc.forever)
+    assert rc.ttl_for(market_url) == (60 * 60, rc.day)
+    assert rc.ttl_for("https://www.edsm.net/api-system-v1/stations?systemName=Sol") == (3 * rc.day, 30 * rc.day)
+    assert rc.ttl_for("https://www.edsm.net/somewhere/else") == rc.default_ttl
+
+def test_fresh_stale_miss(cache, clock):
+    assert cache.lookup(market_url) == (cache.MISS, None)
+    cache.store(market_url, {"commodities": []})
+
+    clock.now += 60 * 60
+    assert cache.lookup(market_url) == (cache.FRESH, {"commodities": []})
+    clock.now += 1
+    assert cache.lookup(market_url) == (cache.STALE, {"commodities": []})
+    clock.now += rc.day
+    assert cache.lookup(market_url) == (cache.MISS, None)
+
+def test_forever_never_expires(cache, clock):
+    cache.store(coords_url, {"coords": {"x": 0, "y": 0, "z": 0}})
+    clock.now += 1000 * rc.day
+    assert cache.lookup(coords_url)[0] == cache.FRESH
+
+def test_store_replaces(cache, clock):
+    cache.store(market_url, {"version": 1})
+    cache.store(market_url, {"version": 2})
+    assert cache.lookup(market_url) == (cache.FRESH, {"version": 2})
+    cache.clear()
+    assert cache.lookup(market_url) == (cache.MISS, None)
+
+# stale answers come from the cache at once while one refresh runs behind them
+def test_client_serves_stale_while_refreshing(cache, clock, monkeypatch):
+    client = EdsmClient(cache=cache)
+    calls = []
+    def try_get_json(url):
+        calls.append(url)
+        return {"version": len(calls)}
+    monkeypatch.setattr(client, "try_get_json", try_get_json)
+
+    assert client.get_json(market_url) == {"version": 1}
+    assert client.get_json(market_url) == {"version": 1}
+    assert len(calls) == 1
+
+    clock.now += 2 * 60 * 60
+    assert client.get_json(market_url) == {"version": 1}
+    client.executor.shutdown(wait=True)
+    assert len(calls) == 2
+    assert cache.lookup(market_url) == (cache.FRESH, {"version": 2})
+
+# empty answers (unknown systems) are asked again next time
+def test_client_does_not_cache_empty(cache, clock, monkeypatch):
+    client = EdsmClient(cache=cache)
+    calls = []
+    def try_get_json(url):
+        calls.append(url)
+        return {}
+    monkeypatch.setattr(client, "try_get_json", try_get_json)
+    client.get_json(coords_url)
+    client.get_json(coords_url)
+    assert len(calls) == 2
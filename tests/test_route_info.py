@@ -0,0 +1,36 @@
+from scripts import classes
+from scripts import trade
+
+def market(buyPrice, sellPrice):
+    return trade.sparse_market([{"id": "test-route", "name": "Route", "buyPrice": buyPrice, "sellPrice": sellPrice, "stock": 100, "demand": 100}])
+
+def system(name, x, stations):
+    result = classes.SystemInfo(name, coords={"x": x, "y": 0.0, "z": 0.0})
+    result.stationInfos = [classes.StationInfo(stationName, name, distance, sparseMarket=sparse) for stationName, distance, sparse in stations]
+    result.stationToScan = [station.name for station in result.stationInfos]
+    return result
+
+# the destination has a rich station far out in supercruise and a poorer one next to the star
+def endpoints():
+    fromSystem = system("Start", 0.0, [("Port", 100, market(100, 0))])
+    toSystem = system("End", 30.0, [("Far Outpost", 500000, market(0, 1100)), ("Near Port", 10, market(0, 700))])
+    return fromSystem, toSystem
+
+def test_ranks_by_profit_without_jump_range():
+    route = classes.RouteInfo(*endpoints(), [], 10)
+    assert route.routeName == "Start/Port -> End/Far Outpost"
+    assert route.route["totalProfit"] == 10000
+    assert "seconds" not in route.route
+
+def test_ranks_by_rate_with_jump_range():
+    route = classes.RouteInfo(*endpoints(), [], 10, jumpRange=15)
+    assert route.routeName == "Start/Port -> End/Near Port"
+    assert route.route["totalProfit"] == 6000
+    assert route.to_dict()["creditsPerHour"] == 6000 * 3600 / route.route["seconds"]
+
+def test_no_route():
+    fromSystem, toSystem = endpoints()
+    fromSystem.stationInfos = [classes.StationInfo("Port", "Start", 100, sparseMarket=market(2000, 0))]
+    route = classes.RouteInfo(fromSystem, toSystem, [], 10, jumpRange=15)
+    assert route.route is None and route.to_dict() is None
+    assert route.parse_info() == "No Route found for Start to End"
@@ -0,0 +1,91 @@
+import math
+from collections import deque
+import pytest
+
+from scripts import classes
+from conftest import random_points
+
+jump_range = 25.0
+
+@pytest.fixture
+def systems():
+    points = random_points(8, 250, spread=120.0)
+    return {"System {}".format(i): {"x": x, "y": y, "z": z} for i, (x, y, z) in enumerate(points.tolist())}
+
+# jump counts from start to every system it reaches, by plain BFS over every pair
+def brute_reach(systems, start):
+    names = list(systems)
+    jumps = {start: 0}
+    queue = deque([start])
+    while queue:
+        name = queue.popleft()
+        for other in names:
+            if other not in jumps and math.dist(systems[name].values(), systems[other].values()) < jump_range:
+                jumps[other] = jumps[name] + 1
+                queue.append(other)
+    return jumps
+
+# shortest jump count, None if unreachable
+def brute_jumps(systems, start, target):
+    return brute_reach(systems, start).get(target)
+
+# a planner over exactly these systems, the offline dataset isn't touched
+def search(systems, start, target, engine, monkeypatch):
+    monkeypatch.setattr(classes.api, "get_system_coord", systems.get)
+    database = classes.RuntimeDatabase()
+    planner = classes.RoutePlanner(start, target, jump_range, database, calculate=False, engine=engine)
+    planner.system_route = []
+    for name, coords in systems.items():
+        database.add_system(classes.SystemInfo(name, coords=coords))
+    database.b_has_collected_datas = True
+    database.build_neighbors(jump_range)
+    planner.search(database.system_names[start], database.system_names[target])
+    return [system.name for system in planner.system_route]
+
+def check_route(systems, route, start, target):
+    assert route[0] == start and route[-1] == target
+    for fromName, toName in zip(route, route[1:]):
+        assert math.dist(systems[fromName].values(), systems[toName].values()) < jump_range
+
+@pytest.mark.parametrize("engine", classes.route_engines)
+def test_routes_match_brute_force(systems, engine, monkeypatch):
+    names = list(systems)
+    reached = 0
+    for start, target in zip(names[:40], names[-40:]):
+        expected = brute_jumps(systems, start, target)
+        route = search(systems, start, target, engine, monkeypatch)
+        if expected is None:
+            assert route == []
+            continue
+        reached += 1
+        check_route(systems, route, start, target)
+        if engine == "astar":
+            # the heuristic never overestimates, so A* finds a shortest route
+            assert len(route) - 1 == expected
+    assert reached
+
+@pytest.mark.parametrize("engine", classes.route_engines)
+def test_target_one_jump_away(engine, monkeypatch):
+    systems = {"A": {"x": 0.0, "y": 0.0, "z": 0.0}, "B": {"x": 10.0, "y": 0.0, "z": 0.0}, "C": {"x": 200.0, "y": 0.0, "z": 0.0}}
+    assert search(systems, "A", "B", engine, monkeypatch) == ["A", "B"]
+    assert search(systems, "A", "C", engine, monkeypatch) == []
+
+# lazy expansion over the offline dataset finds routes as short as the eager gather of both full spheres
+def test_lazy_matches_eager(offline_database, points):
+    systems = {"System {}".format(i): {"x": x, "y": y, "z": z} for i, (x, y, z) in enumerate(points.tolist())}
+    reached = 0
+    for start in list(systems)[:12]:
+        jumps = brute_reach(systems, start)
+        # the farthest reachable system, the sphere around start then holds every system a route can use
+        target = max(jumps, key=lambda name: math.dist(systems[start].values(), systems[name].values()))
+        if target == start:
+            continue
+        routes = []
+        for lazy in (False, True):
+            planner = classes.RoutePlanner(start, target, jump_range, classes.RuntimeDatabase(), lazy=lazy, engine="astar", corridorWidth=0)
+            routes.append([system.name for system in planner.system_route])
+        eager, lazy = routes
+        reached += 1
+        check_route(systems, lazy, start, target)
+        assert len(lazy) == len(eager) == jumps[target] + 1
+    assert reached
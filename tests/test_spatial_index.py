@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from scripts import spatial_index as si
+from conftest import random_points, write_store
+
+# brute force references, every point against every other
+
+def brute_pairs(xyz, maxDist, minDist=0):
+    result = set()
+    for i in range(len(xyz)):
+        for j in range(i + 1, len(xyz)):
+            distance = np.sqrt(((xyz[i] - xyz[j]) ** 2).sum())
+            if minDist < distance < maxDist:
+                result.add((i, j))
+    return result
+
+def brute_radius(xyz, center, radius, minRadius=None):
+    distances = np.sqrt(((xyz - center) ** 2).sum(axis=1))
+    mask = distances <= radius
+    if minRadius:
+        mask &= distances >= minRadius
+    return set(np.flatnonzero(mask).tolist())
+
+def brute_capsule(xyz, start, end, width):
+    result = set()
+    direction = end - start
+    for i, point in enumerate(xyz):
+        # closest point of the segment to point
+        t = min(max(float(np.dot(point - start, direction) / np.dot(direction, direction)), 0.0), 1.0)
+        if np.sqrt(((start + t * direction - point) ** 2).sum()) <= width:
+            result.add(i)
+    return result
+
+def normalized(first, second):
+    return {(min(a, b), max(a, b)) for a, b in zip(first.tolist(), second.tolist())}
+
+@pytest.mark.parametrize("maxDist, minDist", [(15.0, 0), (40.0, 10.0), (1000.0, 0)])
+def test_grid_pairs_matches_brute_force(maxDist, minDist):
+    xyz = random_points(2, 300)
+    first, second = si.grid_pairs(xyz, maxDist, minDist)
+    pairs = normalized(first, second)
+    assert len(pairs) == len(first)
+    assert pairs == brute_pairs(xyz, maxDist, minDist)
+
+def test_grid_pairs_edge_cases():
+    assert len(si.grid_pairs(np.zeros((1, 3)), 10)[0]) == 0
+    assert len(si.grid_pairs(np.zeros((5, 3)), 0)[0]) == 0
+    # points on the same spot are 0 apart, never a pair past minDist 0
+    assert len(si.grid_pairs(np.zeros((3, 3)), 10)[0]) == 0
+    # exactly maxDist apart is out, the range is open on both ends
+    first, second = si.grid_pairs(np.array([[0, 0, 0], [10, 0, 0], [19.5, 0, 0]]), 10)
+    assert normalized(first, second) == {(1, 2)}
+
+def index_rows(index, positions):
+    return set(np.asarray(index.rows)[positions].tolist())
+
+@pytest.mark.parametrize("cellSize", [5.0, 50.0])
+def test_query_radius_matches_brute_force(tmp_path, store, points, cellSize):
+    si.build_spatial_index(store, str(tmp_path / "index"), cellSize=cellSize)
+    index = si.load_spatial_index(str(tmp_path / "index"), store)
+    rng = np.random.default_rng(3)
+    for center in np.concatenate([points[:10], rng.uniform(-400, 400, size=(10, 3))]):
+        for radius, minRadius in [(30.0, None), (120.0, 20.0), (5000.0, None)]:
+            positions, distances = index.query_radius(center, radius, minRadius)
+            assert index_rows(index, positions) == brute_radius(points, center, radius, minRadius)
+            assert np.allclose(distances, np.sqrt(((points[np.asarray(index.rows)[positions]] - center) ** 2).sum(axis=1)))
+
+@pytest.mark.parametrize("cellSize", [1.0, 20.0])
+def test_query_capsule_matches_brute_force(tmp_path, cellSize):
+    # dense enough that the gaps between the sampled spheres would show
+    points = random_points(4, 4000, spread=60.0)
+    store = write_store(tmp_path / "coords", points)
+    si.build_spatial_index(store, str(tmp_path / "index"), cellSize=cellSize)
+    index = si.load_spatial_index(str(tmp_path / "index"), store)
+    rng = np.random.default_rng(4)
+    for _ in range(6):
+        start, end = rng.uniform(-80, 80, size=(2, 3))
+        for width in [4.0, 15.0]:
+            positions, distances = index.query_capsule(start, end, width)
+            assert index_rows(index, positions) == brute_capsule(points, start, end, width)
+            assert np.allclose(distances, si.distances_from(np.asarray(index.xyz)[positions], start))
+
+# queries spanning too many cell columns scan every point instead, same answers
+def test_scans_match_cell_queries(tmp_path, store, points, monkeypatch):
+    si.build_spatial_index(store, str(tmp_path / "index"), cellSize=5.0)
+    index = si.load_spatial_index(str(tmp_path / "index"), store)
+    center = points[0]
+    start, end = points[1], points[2]
+    expectedRadius = index_rows(index, index.query_radius(center, 80.0, 10.0)[0])
+    expectedCapsule = index_rows(index, index.query_capsule(start, end, 30.0)[0])
+
+    monkeypatch.setattr(si, "max_query_columns", 1)
+    monkeypatch.setattr(si, "scan_batch_size", 97)
+    assert index_rows(index, index.query_radius(center, 80.0, 10.0)[0]) == expectedRadius
+    assert index_rows(index, index.query_capsule(start, end, 30.0)[0]) == expectedCapsule
+
+# the store's own scans are the fallback without an index, both give the same batches
+def test_store_scans_match_index(tmp_path, store, points):
+    si.build_spatial_index(store, str(tmp_path / "index"))
+    index = si.load_spatial_index(str(tmp_path / "index"), store)
+    center = points[5]
+    fromIndex = index.query_batch(center, 70.0, 5.0)
+    fromStore = store.query_batch(center, 70.0, 5.0)
+    assert sorted(fromIndex.names) == sorted(fromStore.names)
+    assert set(fromStore.names) == {"System {}".format(i) for i in brute_radius(points, center, 70.0, 5.0)}
+
+    start, end = points[6], points[7]
+    assert sorted(index.capsule_batch(start, end, 25.0).names) == sorted(store.capsule_batch(start, end, 25.0).names)
+
+def test_index_for_another_store_is_not_loaded(tmp_path, store):
+    si.build_spatial_index(store, str(tmp_path / "index"))
+    other = write_store(tmp_path / "other", random_points(5, 10))
+    assert si.load_spatial_index(str(tmp_path / "index"), other) is None
+
+def test_empty_store(tmp_path):
+    empty = write_store(tmp_path / "empty", [])
+    si.build_spatial_index(empty, str(tmp_path / "index"))
+    index = si.load_spatial_index(str(tmp_path / "index"), empty)
+    assert len(index.query_radius(np.zeros(3), 100.0)[0]) == 0
+    assert len(index.query_capsule(np.zeros(3), np.ones(3), 100.0)[0]) == 0
@@ -0,0 +1,93 @@
+import pytest
+
+from scripts import classes
+from scripts import trade
+
+# a station of commodityCount commodities, station_size grows with it
+def station(name, commodityCount=0):
+    records = [{"id": "test-registry-{}".format(i), "name": "Registry {}".format(i), "buyPrice": 10, "sellPrice": 20, "stock": 1, "demand": 1}
+               for i in range(commodityCount)]
+    return classes.StationInfo(name, "Sol", sparseMarket=trade.sparse_market(records))
+
+def size_of(commodityCount):
+    return classes.station_base_bytes + classes.station_commodity_bytes * commodityCount
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(classes.time, "time", clock.time)
+    return clock
+
+def test_evicts_least_recently_used(clock):
+    registry = classes.StationRegistry(maxBytes=3 * size_of(2))
+    for id in range(3):
+        registry.add(id, station("Station {}".format(id), 2))
+    assert registry.size == 3 * size_of(2)
+
+    # reading 0 makes 1 the oldest, it goes first when 3 doesn't fit
+    assert registry.get(0).name == "Station 0"
+    registry.add(3, station("Station 3", 2))
+    assert list(registry.stations) == [2, 0, 3]
+    assert registry.size == 3 * size_of(2)
+
+    # a bigger station pushes out as many as it needs
+    registry.add(4, station("Station 4", 5))
+    assert list(registry.stations) == [3, 4]
+    assert registry.size == size_of(2) + size_of(5)
+
+def test_readding_replaces(clock):
+    registry = classes.StationRegistry(maxBytes=10 * size_of(1))
+    registry.add(1, station("Old", 1))
+    registry.add(1, station("New", 3))
+    assert len(registry) == 1 and registry.get(1).name == "New"
+    assert registry.size == size_of(3)
+
+def test_keeps_the_newest_even_over_the_cap(clock):
+    registry = classes.StationRegistry(maxBytes=size_of(1))
+    registry.add(1, station("Small", 1))
+    registry.add(2, station("Huge", 50))
+    assert list(registry.stations) == [2]
+
+def test_resize_shrinks(clock):
+    registry = classes.StationRegistry(maxBytes=10 * size_of(0))
+    for id in range(6):
+        registry.add(id, station("Station {}".format(id)))
+    registry.resize(2 * size_of(0))
+    assert list(registry.stations) == [4, 5]
+    assert registry.size == 2 * size_of(0)
+    registry.resize(10 * size_of(0))
+    assert len(registry) == 2
+
+def test_max_age(clock):
+    registry = classes.StationRegistry(maxAge=3600)
+    registry.add(1, station("Early"))
+    clock.now += 1800
+    registry.add(2, station("Late"))
+    clock.now += 1800
+    assert registry.get(1) is not None
+    clock.now += 1
+    assert registry.get(1) is None
+    assert 1 not in registry and registry.size == size_of(0)
+    assert registry.get(2) is not None
+
+def test_sync_clears_on_a_new_dataset_version(clock):
+    registry = classes.StationRegistry()
+    registry.sync(1)
+    registry.add(1, station("Kept"))
+    registry.sync(1)
+    assert registry.get(1) is not None
+    registry.sync(2)
+    assert len(registry) == 0 and registry.size == 0
+
+    # sync also takes over the backend's max age, i.e 1 hour online
+    registry.add(1, station("Online"))
+    registry.sync(2, 60)
+    clock.now += 61
+    assert registry.get(1) is None
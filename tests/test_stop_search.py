@@ -0,0 +1,136 @@
+import itertools
+import numpy as np
+import pytest
+
+from scripts import trade
+from test_trade import brute_trade, random_records, station
+
+# groups of stations in route order, the first and last never empty
+def random_groups(seed, groupCount):
+    rng = np.random.default_rng(seed)
+    recordGroups = []
+    for group in range(groupCount):
+        low = 1 if group in (0, groupCount - 1) else 0
+        recordGroups.append([random_records(rng) for _ in range(rng.integers(low, 5))])
+    return recordGroups, [[station(records) for records in group] for group in recordGroups]
+
+# every route the search may take: one station per visited group, legs only inside the window
+def brute_routes(recordGroups, cargoSpace, capital, maxStops, window):
+    last = len(recordGroups) - 1
+    for stops in range(maxStops + 1):
+        for middle in itertools.combinations(range(1, last), stops):
+            groups = (0,) + middle + (last,)
+            if any(not (source == 0 or target == last or target - source <= window) for source, target in zip(groups, groups[1:])):
+                continue
+            for stations in itertools.product(*[range(len(recordGroups[group])) for group in groups]):
+                profits = []
+                for (source, fromId), (target, toId) in zip(zip(groups, stations), list(zip(groups, stations))[1:]):
+                    profits.append(brute_trade(recordGroups[source][fromId], recordGroups[target][toId], cargoSpace, capital)[0])
+                # a leg without a profitable trade isn't taken
+                if min(profits) > 0:
+                    yield stops, list(zip(groups, stations)), sum(profits)
+
+def flat_path(search, route):
+    return [int(search.offsets[group]) + station for group, station in route]
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("maxStops, window", [(0, 8), (1, 8), (2, 8), (3, 2)])
+def test_best_matches_brute_force(seed, maxStops, window):
+    recordGroups, groups = random_groups(seed, 7)
+    # without leg times stopSeconds has nothing to add to, routes are ranked by profit
+    search = trade.StopSearch(groups, 16, maxStops=maxStops, stopSeconds=300, window=window)
+    routes = list(brute_routes(recordGroups, 16, None, maxStops, window))
+
+    scores = {}
+    for stops, route, profit in routes:
+        scores[tuple(flat_path(search, route))] = (stops, profit, profit)
+    for stops in range(maxStops + 1):
+        expected = [score for path, (count, profit, score) in scores.items() if count == stops]
+        result = search.best(stops)
+        if not expected:
+            assert result is None
+            continue
+        score, profit, seconds, path = result
+        assert score == pytest.approx(max(expected))
+        assert scores[tuple(path)][1:] == (profit, score)
+        assert seconds is None
+
+    for minStops in range(maxStops + 1):
+        expected = [score for path, (count, profit, score) in scores.items() if count >= minStops]
+        result = search.best_any(minStops)
+        assert (result is None) == (not expected)
+        if expected:
+            assert result[0] == pytest.approx(max(expected))
+
+def test_legs_add_up_to_the_route():
+    recordGroups, groups = random_groups(5, 7)
+    search = trade.StopSearch(groups, 16, capital=3000, maxStops=2)
+    score, profit, seconds, path = search.best_any()
+    legs = search.legs(path)
+    assert len(legs) == len(path) - 1
+    assert sum(legProfit for items, legProfit in legs) == profit
+    for items, legProfit in legs:
+        assert sum(item["profit"] for item in items) == legProfit
+        assert sum(item["count"] for item in items) <= 16
+
+# seconds into each target station, longer for legs that skip more groups
+def leg_seconds_table(seed, groups):
+    rng = np.random.default_rng(seed)
+    table = {}
+    for target in range(1, len(groups)):
+        for source in range(target):
+            table[(source, target)] = 200 * (target - source) + rng.uniform(30, 900, size=len(groups[target]))
+    return table
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("maxStops, window, stopSeconds, minStops", [(1, 8, 0, 0), (3, 8, 600, 0), (3, 2, 0, 1), (2, 8, 120, 2)])
+def test_best_rate_matches_brute_force(seed, maxStops, window, stopSeconds, minStops):
+    recordGroups, groups = random_groups(seed, 7)
+    table = leg_seconds_table(seed, groups)
+    search = trade.StopSearch(groups, 16, maxStops=maxStops, stopSeconds=stopSeconds, window=window,
+                              legSeconds=lambda source, target: table[(source, target)])
+
+    rates = {}
+    for stops, route, profit in brute_routes(recordGroups, 16, None, maxStops, window):
+        if stops < minStops:
+            continue
+        seconds = sum(table[(source, target)][station] for (source, _), (target, station) in zip(route, route[1:])) + stopSeconds * stops
+        rates[tuple(flat_path(search, route))] = (profit * 3600 / seconds, profit, seconds)
+
+    result = search.best_rate(minStops)
+    if not rates:
+        assert result is None
+        return
+    rate, profit, seconds, path = result
+    assert rate == pytest.approx(max(value[0] for value in rates.values()))
+    expectedRate, expectedProfit, expectedSeconds = rates[tuple(path)]
+    assert (rate, profit, seconds) == pytest.approx((expectedRate, expectedProfit, expectedSeconds))
+
+# a short cheap route beats a long rich one per hour, profit alone would pick the long one
+def test_best_rate_prefers_faster_routes():
+    gold = lambda buyPrice, sellPrice: [{"id": "test-rate", "name": "Rate", "buyPrice": buyPrice, "sellPrice": sellPrice, "stock": 100, "demand": 100}]
+    groups = [[station(gold(100, 0))], [station(gold(0, 0)), station(gold(0, 0))], [station(gold(0, 1100)), station(gold(0, 600))]]
+    seconds = {(0, 1): np.array([60.0, 60.0]), (1, 2): np.array([60.0, 60.0]), (0, 2): np.array([3600.0, 60.0])}
+    search = trade.StopSearch(groups, 10, legSeconds=lambda source, target: seconds[(source, target)])
+    assert search.best_any()[3] == [0, 3]
+    rate, profit, seconds, path = search.best_rate()
+    assert path == [0, 4]
+    assert rate == pytest.approx(5000 * 3600 / 60)
+
+def test_best_rate_without_leg_times_ranks_by_profit():
+    recordGroups, groups = random_groups(5, 7)
+    search = trade.StopSearch(groups, 16, maxStops=2, stopSeconds=100)
+    assert search.best_rate(1) == search.best_any(1)
+    assert search.best_rate()[2] is None
+
+# a stop worth a detour in profit per hour stops being worth it once it takes long enough
+def test_stop_seconds_skip_slow_stops():
+    gold = lambda buyPrice, sellPrice: [{"id": "test-rate", "name": "Rate", "buyPrice": buyPrice, "sellPrice": sellPrice, "stock": 100, "demand": 100}]
+    groups = [[station(gold(100, 0))], [station(gold(200, 300))], [station(gold(0, 500))]]
+    seconds = {(0, 1): np.array([300.0]), (1, 2): np.array([300.0]), (0, 2): np.array([600.0])}
+    legSeconds = lambda source, target: seconds[(source, target)]
+    # via the stop 2000 + 3000 in 600s beats 4000 in 600s direct
+    assert trade.StopSearch(groups, 10, legSeconds=legSeconds).best_rate()[3] == [0, 1, 2]
+    # 5000 in 1200s is below 4000 in 600s
+    rate, profit, routeSeconds, path = trade.StopSearch(groups, 10, stopSeconds=600, legSeconds=legSeconds).best_rate()
+    assert path == [0, 2] and routeSeconds == 600
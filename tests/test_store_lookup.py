@@ -0,0 +1,38 @@
+import os
+import sys
+import subprocess
+import numpy as np
+
+from scripts import name_index as ni
+from scripts import store_lookup
+from conftest import random_points, write_store
+
+def build(tmp_path, names):
+    store = write_store(tmp_path / "coords", random_points(9, len(names)), names)
+    ni.build_name_index(np.asarray(store.nameHashes), str(tmp_path / "index"))
+    return store, str(tmp_path / "coords"), str(tmp_path / "index")
+
+# same answers as the mapped store, read a few bytes at a time
+def test_lookup_matches_store(tmp_path):
+    names = ["System {}".format(i) for i in range(400)] + ["Ålmhult", "Sol", "Sol"]
+    store, storePath, indexPath = build(tmp_path, names)
+    assert store_lookup.has_lookup(storePath, indexPath)
+    for name in names:
+        rows = store.find_rows(name)
+        assert store_lookup.lookup_rows(storePath, indexPath, name) == rows
+        assert store_lookup.lookup_system_coords(storePath, indexPath, name) == store.get_coords(rows[0])
+    assert store_lookup.lookup_system_coords(storePath, indexPath, "Not A System") is None
+
+def test_no_lookup_without_a_matching_index(tmp_path):
+    store, storePath, indexPath = build(tmp_path, ["System {}".format(i) for i in range(20)])
+    assert not store_lookup.has_lookup(storePath, str(tmp_path / "missing"))
+    ni.build_name_index(np.asarray(store.nameHashes)[:10], indexPath)
+    assert not store_lookup.has_lookup(storePath, indexPath)
+
+def test_lookups_do_not_import_numpy(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    build(tmp_path, ["Sol", "Achenar"])
+    code = "import sys; from scripts import store_lookup; print(store_lookup.lookup_system_coords(sys.argv[1], sys.argv[2], 'Achenar') is not None, 'numpy' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code, str(tmp_path / "coords"), str(tmp_path / "index")],
+                            capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=root), timeout=60)
+    assert result.stdout.split() == ["True", "False"], result.stderr
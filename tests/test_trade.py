@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from scripts import trade
+
+commodity_count = 12
+
+# StopSearch and MarketTable only read station.marketInfo.sparse
+def station(records):
+    return SimpleNamespace(marketInfo=SimpleNamespace(sparse=trade.sparse_market(records)))
+
+def random_records(rng):
+    records = []
+    for id in rng.choice(commodity_count, size=rng.integers(0, commodity_count + 1), replace=False).tolist():
+        records.append({
+            "id" : "test-{}".format(id),
+            "name" : "Commodity {}".format(id),
+            "buyPrice" : int(rng.integers(0, 1000)),
+            "sellPrice" : int(rng.integers(0, 1000)),
+            "stock" : int(rng.choice([0, 0, 3, 20, 200])),
+            "demand" : int(rng.choice([0, 4, 30, 500])),
+        })
+    return records
+
+def random_stations(seed, count):
+    rng = np.random.default_rng(seed)
+    records = [random_records(rng) for _ in range(count)]
+    return records, [station(market) for market in records]
+
+# one pair the slow way: every commodity on its own, most profitable first, then capped by cargo and credits
+def brute_trade(sourceRecords, targetRecords, cargoSpace, capital=None):
+    targets = {record["id"]: record for record in targetRecords}
+    candidates = []
+    for record in sourceRecords:
+        target = targets.get(record["id"])
+        if target is None or record["stock"] <= 0 or target["demand"] <= target["stock"] - trade.demand_threshold:
+            continue
+        unitProfit = target["sellPrice"] - record["buyPrice"]
+        if unitProfit > 0:
+            column = trade.commodity_columns.column(record["id"], record["name"])
+            candidates.append((-unitProfit, column, record, min(record["stock"], target["demand"])))
+    candidates.sort(key=lambda candidate: candidate[:2])
+
+    profit = 0
+    counts = {}
+    cargoLeft = cargoSpace
+    capitalLeft = capital
+    for negativeProfit, column, record, cap in candidates:
+        count = min(cap, cargoLeft)
+        if capital is not None and record["buyPrice"] > 0:
+            count = min(count, capitalLeft // record["buyPrice"])
+        if count <= 0:
+            continue
+        counts[record["id"]] = count
+        cargoLeft -= count
+        if capital is not None:
+            capitalLeft -= count * record["buyPrice"]
+        profit += -negativeProfit * count
+    return profit, counts
+
+def check_pairs(seed, cargoSpace, capital=None):
+    sourceRecords, sources = random_stations(seed, 9)
+    targetRecords, targets = random_stations(seed + 100, 7)
+    trades = trade.PairTrades(trade.MarketTable(sources), trade.MarketTable(targets), cargoSpace, capital)
+    traded = 0
+    for source in range(len(sources)):
+        for target in range(len(targets)):
+            profit, counts = brute_trade(sourceRecords[source], targetRecords[target], cargoSpace, capital)
+            assert trades.profit(source, target) == profit
+            items = trades.items(source, target)
+            assert {item["itemId"]: item["count"] for item in items} == counts
+            assert sum(item["profit"] for item in items) == profit
+            traded += bool(counts)
+    assert traded
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("cargoSpace", [1, 16, 720])
+def test_pair_trades_match_brute_force(seed, cargoSpace):
+    check_pairs(seed, cargoSpace)
+
+def test_fill_sorted():
+    caps = np.array([[5, 3, 0, 10], [0, 0, 0, 0]])
+    assert trade.fill_sorted(caps, 7).tolist() == [[5, 2, 0, 0], [0, 0, 0, 0]]
+    assert trade.fill_sorted(caps, 100).tolist() == caps.tolist()
+
+def test_empty_markets():
+    trades = trade.PairTrades(trade.MarketTable([station([])]), trade.MarketTable([station([])]), 8)
+    assert trades.profit(0, 0) == 0
+    assert trades.items(0, 0) == []
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("capital", [300, 2500, 100000])
+def test_pair_trades_with_capital_match_brute_force(seed, capital):
+    check_pairs(seed, 64, capital)
+
+def test_fill_sorted_capital():
+    caps = np.array([[5, 3, 10]])
+    buyPrices = np.array([[100, 0, 30]])
+    # 3 of the first use up all 300 credits, the free one is still taken
+    assert trade.fill_sorted_capital(caps, buyPrices, 30, 300).tolist() == [[3, 3, 0]]
+    assert trade.fill_sorted_capital(caps, buyPrices, 30, 1000).tolist() == [[5, 3, 10]]
+    assert trade.fill_sorted_capital(caps, buyPrices, 6, 10 ** 6).tolist() == [[5, 1, 0]]